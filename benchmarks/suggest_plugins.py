@@ -0,0 +1,132 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+Compares the indexed PluginMatcher with the original pairwise matching used by `PluginHandler.suggest_plugins`.
+
+Usage: python benchmarks/suggest_plugins.py [plugins] [games]
+"""
+
+import os
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+from types import SimpleNamespace
+from typing import Dict, List
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+from api import PluginMatcher as matcher_module
+from api.PluginMatcher import PluginMatcher
+
+words = (
+    "war thunder world tanks ships planes space star galaxy empire kingdom legends heroes city skies "
+    "dark souls call duty battle field age empires total strategy simulator racing rally dirt forza "
+    "horizon counter strike global offensive rocket league grand theft auto red dead redemption"
+).split()
+
+
+def legacy(trusted: List, games: Dict[str, str]) -> List:
+    """
+    The matching done by `suggest_plugins` before the index was added.
+    """
+    threshold = 0.9
+
+    install = []
+    for plugin in trusted:
+        matches = []
+
+        for loc, game in games.items():
+            match = SequenceMatcher(None, plugin.game, game).ratio()
+            matches.append(match)
+
+            if match >= 1:
+                break
+            elif (
+                match < threshold
+                and plugin.game in game
+                or plugin.game.replace(":", "") in game.replace(":", "")
+            ):
+                matches.append(threshold)
+
+        if max(matches) >= threshold:
+            install.append(plugin)
+
+    return install
+
+
+def title(rng: random.Random) -> str:
+    name = " ".join(rng.choice(words).capitalize() for _ in range(rng.randint(1, 4)))
+    if rng.random() < 0.3:
+        name += f": {rng.choice(words).capitalize()}"
+
+    return name
+
+
+def variant(rng: random.Random, name: str) -> str:
+    r = rng.random()
+    if r < 0.3:
+        return name
+    elif r < 0.5:
+        return f"{name} {rng.choice(('Remastered', 'GOTY', 'Deluxe Edition', '2'))}"
+    elif r < 0.7:
+        return name.replace(":", "")
+    elif r < 0.85:
+        # A typo.
+        i = rng.randrange(len(name))
+        return name[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + name[i + 1 :]
+
+    return title(rng)
+
+
+def main(plugin_count: int = 2000, game_count: int = 300) -> None:
+    rng = random.Random(0)
+
+    plugins = [SimpleNamespace(game=title(rng)) for _ in range(plugin_count)]
+    games = {
+        f"/games/{i}": variant(rng, rng.choice(plugins).game) for i in range(game_count)
+    }
+
+    start = time.perf_counter()
+    expected = legacy(plugins, games)
+    legacy_time = time.perf_counter() - start
+    print(f"legacy: {legacy_time:.3f}s, {len(expected)} suggestions")
+
+    numpy = matcher_module.numpy
+    for label, backend in (("numpy", numpy), ("pure python", None)):
+        if label == "numpy" and numpy is None:
+            print("numpy: not installed")
+            continue
+
+        matcher_module.numpy = backend
+        try:
+            start = time.perf_counter()
+            found = PluginMatcher(plugins).match(games.values())
+            elapsed = time.perf_counter() - start
+        finally:
+            matcher_module.numpy = numpy
+
+        same = [id(p) for p in found] == [id(p) for p in expected]
+        print(
+            f"{label}: {elapsed:.3f}s ({legacy_time / elapsed:.1f}x faster), "
+            f"{len(found)} suggestions, {'same as' if same else 'DIFFERENT FROM'} legacy"
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
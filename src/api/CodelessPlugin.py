@@ -13,13 +13,26 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
-from typing import Tuple
+import logging
+from os.path import join
+from typing import Tuple, Optional, Union, List
 
+from api import ObjectStore, archive
 from api.Keys import Keys
 from api.Platform import Platform
 from api.Plugin import Plugin
-from api.files import _copyfiles
+from api.ObjectStore import Tree
+from api.archive import ArchiveWriter
+from api.files import (
+    _copyfiles,
+    _storefiles,
+    _restorefiles,
+    _resolve,
+    _rollback_dir,
+    SyncReport,
+)
 from api.profiles import Profile, ProfileType
+from utils import settings
 
 
 class CodelessPlugin(Plugin):
@@ -49,34 +62,95 @@ class CodelessPlugin(Plugin):
         self.save_profile_yaml(profile, path)
         game = self.game_path
 
-        for p in self._get_profile_types(profile):
-            if p is ProfileType.GRAPHICS:
-                if graphics := self.get_path(Keys.GRAPHICS_CONFIG):
-                    _copyfiles(game, path, graphics, creating_profile=True)
-
-            elif p is ProfileType.KEYMAPS:
-                if keymap := self.get_path(Keys.KEYMAP_CONFIG):
-                    _copyfiles(game, path, keymap, creating_profile=True)
-
-            elif p is ProfileType.GAME_SAVES:
-                if saves := self.get_path(Keys.SAVES_FOLDER):
-                    _copyfiles(game, path, saves, creating_profile=True)
+        prefs = settings.get_instance()
+        store = ObjectStore.get_instance()
+        tree = Tree()
+        writer = None
+
+        try:
+            for p in self._get_profile_types(profile):
+                if item_paths := self._get_item_paths(p):
+                    # Profile types can be opted in to being compressed, which suits large game saves.
+                    if p.value in prefs.archive_types:
+                        writer = writer or ArchiveWriter(
+                            join(path, archive.filename),
+                            prefs.archive_codec,
+                            prefs.archive_level,
+                        )
+                        _storefiles(store, tree, game, item_paths, writer)
+                    else:
+                        _storefiles(store, tree, game, item_paths)
+        except Exception as e:
+            # Remove any blobs which were only added for this profile.
+            store.prune(tree.digests())
+            raise e
+        finally:
+            if writer:
+                writer.close()
+
+        store.retain(tree.digests())
+
+        try:
+            tree.save(path)
+        except Exception as e:
+            store.release(tree.digests())
+            raise e
 
     def apply(self, profile: Profile, path: str) -> None:
         game = self.game_path
+        tree = Tree.load(path)
 
-        for p in self._get_profile_types(profile):
-            if p is ProfileType.GRAPHICS:
-                if graphics := self.get_path(Keys.GRAPHICS_CONFIG):
-                    _copyfiles(path, game, graphics, creating_profile=False)
-
-            elif p is ProfileType.KEYMAPS:
-                if keymap := self.get_path(Keys.KEYMAP_CONFIG):
-                    _copyfiles(path, game, keymap, creating_profile=False)
+        prefs = settings.get_instance()
+        report = SyncReport()
 
-            elif p is ProfileType.GAME_SAVES:
-                if saves := self.get_path(Keys.SAVES_FOLDER):
-                    _copyfiles(path, game, saves, creating_profile=False)
+        for p in self._get_profile_types(profile):
+            if item_paths := self._get_item_paths(p):
+                if tree:
+                    _restorefiles(
+                        ObjectStore.get_instance(),
+                        tree,
+                        game,
+                        item_paths,
+                        prefs.incremental_apply,
+                        report,
+                        prefs.swap_folders,
+                    )
+                else:
+                    # Profiles saved before the object store existed contain plain copies of the files.
+                    _copyfiles(path, game, item_paths, creating_profile=False)
+
+        logging.info(f"Applied profile '{profile.name}': {report}")
+
+    def rollback(self) -> bool:
+        """
+        Restores the folders which were replaced when the last profile was applied.
+
+        :return: whether any folders were restored
+        """
+        restored = False
+
+        for p in self.get_features():
+            item_paths = self._get_item_paths(p) or []
+            if not isinstance(item_paths, List):
+                item_paths = [item_paths]
+
+            for item_path in item_paths:
+                _, _to = _resolve("", self.game_path, item_path, creating_profile=False)
+                restored = _rollback_dir(_to) or restored
+
+        return restored
+
+    def _get_item_paths(
+        self, profile_type: ProfileType
+    ) -> Optional[Union[str, List[str]]]:
+        if profile_type is ProfileType.GRAPHICS:
+            return self.get_path(Keys.GRAPHICS_CONFIG)
+        elif profile_type is ProfileType.KEYMAPS:
+            return self.get_path(Keys.KEYMAP_CONFIG)
+        elif profile_type is ProfileType.GAME_SAVES:
+            return self.get_path(Keys.SAVES_FOLDER)
+
+        return None
 
     def _get_profile_types(self, profile: Profile) -> Tuple[ProfileType]:
         profile_type = profile.feature.types
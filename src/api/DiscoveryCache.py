@@ -0,0 +1,202 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from api import files
+from utils import serialization
+
+_cache: "DiscoveryCache" = None
+
+
+def get_instance() -> "DiscoveryCache":
+    global _cache
+
+    if not _cache:
+        _cache = DiscoveryCache(files.discovery_path())
+
+    return _cache
+
+
+class Stats:
+    """
+    Counters describing how many scan roots were served from the cache.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self) -> str:
+        return f"{self.hits} cache hits, {self.misses} cache misses"
+
+
+class DiscoveryCache:
+    """
+    Persistent record of the games found under each scan root, so unchanged roots don't have to be scanned
+    again when Switcher starts.
+
+    Each entry records the modification times of the folders (or files) its result was read from. Adding or
+    removing a game changes the modification time of the folder containing it, so the entry is scanned again
+    when any of them change. Entries are also scanned again once they are older than `max_age`, in case a
+    change was missed.
+    """
+
+    # Seconds after which an entry is scanned again, even if nothing appears to have changed.
+    max_age = 7 * 24 * 60 * 60
+
+    version = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stats = Stats()
+
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        # Roots which have been looked up since the cache was last saved.
+        self._used: Set[str] = set()
+        self._lock = threading.Lock()
+
+        self.reload()
+
+    def reload(self) -> None:
+        data = None
+
+        if os.path.exists(self.path):
+            try:
+                data = serialization.load(self.path)
+            except Exception as e:
+                logging.error(
+                    f"Could not read the discovery cache, so it will be rebuilt: {e}"
+                )
+
+        with self._lock:
+            if isinstance(data, dict) and data.get("version") == self.version:
+                self._entries = data.get("roots") or {}
+            else:
+                self._entries = {}
+
+            self._dirty = False
+
+    def lookup(self, root: str, scan: Callable[[], Tuple[Any, List[str]]]) -> Any:
+        """
+        Gets the result of scanning a root, scanning it only if the cached result is missing or out of date.
+
+        :param root: the key identifying the root, usually its path
+        :param scan: function which scans the root, returning the result (which must be serialisable to YAML)
+            and the paths to the folders or files which the result was read from
+        :return: the result of the scan
+        """
+        if (result := self.get(root)) is not None:
+            return result
+
+        result, watched = scan()
+        self.put(root, result, watched)
+
+        return result
+
+    def get(self, root: str) -> Any:
+        """
+        :param root: the key identifying the root
+        :return: the cached result of scanning the root, or None if it needs to be scanned again
+        """
+        with self._lock:
+            self._used.add(root)
+            entry = self._entries.get(root)
+
+        valid = entry is not None and self._is_valid(entry)
+
+        with self._lock:
+            if valid:
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+
+        return entry["result"] if valid else None
+
+    def put(self, root: str, result: Any, watched: List[str]) -> None:
+        """
+        Stores the result of scanning a root.
+
+        :param root: the key identifying the root
+        :param result: the result, which must be serialisable to YAML
+        :param watched: the paths to the folders or files which the result was read from
+        """
+        entry = {
+            "time": time.time(),
+            "watched": {p: _mtime(p) for p in dict.fromkeys(watched)},
+            "result": result,
+        }
+
+        with self._lock:
+            self._used.add(root)
+            self._entries[root] = entry
+            self._dirty = True
+
+    def _is_valid(self, entry: Dict[str, Any]) -> bool:
+        if time.time() - entry.get("time", 0) > self.max_age:
+            return False
+
+        return all(_mtime(p) == mtime for p, mtime in entry.get("watched", {}).items())
+
+    def watched_paths(self) -> List[str]:
+        """
+        :return: the paths to every folder and file which the cached results were read from
+        """
+        with self._lock:
+            return list(
+                dict.fromkeys(
+                    p for e in self._entries.values() for p in e.get("watched", {})
+                )
+            )
+
+    def clear(self) -> None:
+        """
+        Forgets every entry, so the next lookups scan everything again.
+        """
+        with self._lock:
+            self._dirty = bool(self._entries) or self._dirty
+            self._entries = {}
+
+    def save(self) -> None:
+        """
+        Writes the cache to disk if it has changed. Entries which haven't been looked up since the last save are
+        dropped, since their roots are no longer scanned (e.g. a library folder which has been removed).
+        """
+        with self._lock:
+            for root in [r for r in self._entries if r not in self._used]:
+                del self._entries[root]
+                self._dirty = True
+
+            self._used = set()
+
+            if not self._dirty:
+                return
+
+            data = {"version": self.version, "roots": dict(self._entries)}
+            self._dirty = False
+
+        serialization.dump(data, self.path)
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
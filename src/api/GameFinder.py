@@ -13,41 +13,166 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import glob
+import json
+import logging
 import os
+import sqlite3
 import string
+import threading
+import time
 from abc import ABC, abstractmethod
+from contextlib import closing
 from os.path import join
-from typing import List, Dict
+from typing import List, Dict, Any, Callable, Tuple, AsyncIterator, Optional
 
-from scheduler.Scheduler import Scheduler
-
-from api import LibraryAnalyser
+from api import vdf, DiscoveryCache
+from api.LibraryScanner import LibraryScanner
 from api.Platform import Platform
+from utils import settings
 
 
 def get() -> "GameFinder":
     platform = Platform.get()
+    cache = DiscoveryCache.get_instance()
 
     if platform is Platform.WINDOWS:
-        return WindowsGameFinder()
+        return WindowsGameFinder(cache)
+    elif platform is Platform.LINUX:
+        return LinuxGameFinder(cache=cache)
     else:
-        raise NotImplementedError("Linux/macOS GameFinders not implemented yet.")
+        raise NotImplementedError("macOS GameFinder not implemented yet.")
 
 
 class GameFinder(ABC):
-    def __init__(self):
-        self.scheduler = None
+    def __init__(self, cache: DiscoveryCache.DiscoveryCache = None):
+        self.cache = cache
+
+        # Wine prefixes of Windows games running through Proton, keyed by the paths to the games.
+        self.proton_prefixes: Dict[str, str] = {}
+
+        # Discovery runs on worker threads, e.g. for the GameWatcher and for MainWindow, and changes the cache and
+        # the finder's own state, so only one discovery runs at a time.
+        self._discover_lock = threading.Lock()
+
+        # Seconds between starting the last discovery and finding the first game, or None if no games were found.
+        self.first_result_latency: Optional[float] = None
+
+    async def coro_find_games(self, force: bool = False) -> Dict[str, str]:
+        return {path: name async for path, name in self.stream_games(force)}
+
+    async def stream_games(self, force: bool = False) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Finds games on the system in a background thread, yielding each game as soon as it is found.
+
+        Parameters
+        ----------
+        force : bool
+            Whether to ignore the cache and scan everything again.
+
+        Returns
+        -------
+        AsyncIterator[Tuple[str, str]]
+            Asynchronous generator yielding the path to each game with its name.
+        """
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+        done = object()
+
+        def on_found(games: Dict[str, str]) -> None:
+            loop.call_soon_threadsafe(queue.put_nowait, dict(games))
+
+        start = time.monotonic()
+        self.first_result_latency = None
+
+        future = loop.run_in_executor(None, self.discover, force, on_found)
+        future.add_done_callback(lambda _: queue.put_nowait(done))
+
+        seen = set()
+        while (batch := await queue.get()) is not done:
+            for path, name in batch.items():
+                if path in seen:
+                    continue
+
+                if self.first_result_latency is None:
+                    self.first_result_latency = time.monotonic() - start
+                    logging.info(
+                        f"Found the first game after {self.first_result_latency:.3f}s."
+                    )
 
-    async def coro_find_games(self) -> Dict[str, str]:
-        self.scheduler = Scheduler(run_in_thread=True)
-        result = await self.scheduler.map(target=self.find_games, args=[(),])
-        return result[0]
+                seen.add(path)
+                yield path, name
+
+        # Raises any error from discovery, and yields any games which weren't reported while they were found.
+        for path, name in (await future).items():
+            if path not in seen:
+                seen.add(path)
+                yield path, name
+
+    def discover(
+        self, force: bool = False, on_found: Callable[[Dict[str, str]], None] = None
+    ) -> Dict[str, str]:
+        """
+        Finds games on the system, skipping roots which haven't changed since they were last scanned. If another
+        thread is already discovering games, this waits for it to finish first.
+
+        Parameters
+        ----------
+        force : bool
+            Whether to ignore the cache and scan everything again.
+        on_found : Callable[[Dict[str, str]], None], optional
+            Function called from the discovering thread with games as soon as they are found.
+
+        Returns
+        -------
+        Dict[str, str]
+            Dictionary whose keys are the paths to possible discovered games, and whose corresponding values are the
+            names of the games.
+        """
+        with self._discover_lock:
+            if self.cache and force:
+                self.cache.clear()
+
+            games = self.find_games(on_found or _ignore)
+
+            if self.cache:
+                self.cache.save()
+                logging.info(f"Discovered {len(games)} games ({self.cache.stats}).")
+
+            return games
+
+    def lookup(self, root: str, scan: Callable[[], Tuple[Any, List[str]]]) -> Any:
+        """
+        Gets the result of scanning a root, from the cache if the root hasn't changed.
+
+        Parameters
+        ----------
+        root : str
+            The path to the root.
+        scan : Callable[[], Tuple[Any, List[str]]]
+            Function which scans the root, returning the result and the paths it was read from.
+
+        Returns
+        -------
+        Any
+            The result of scanning the root.
+        """
+        if self.cache:
+            return self.cache.lookup(root, scan)
+
+        return scan()[0]
 
     @abstractmethod
-    def find_games(self) -> Dict[str, str]:
+    def find_games(self, on_found: Callable[[Dict[str, str]], None]) -> Dict[str, str]:
         """
         Finds games on the system.
 
+        Parameters
+        ----------
+        on_found : Callable[[Dict[str, str]], None]
+            Function to call with games as soon as they are found, before the search finishes.
+
         Returns
         -------
         Dict[str, str]
@@ -57,38 +182,345 @@ class GameFinder(ABC):
 
 
 class WindowsGameFinder(GameFinder):
-    def find_games(self) -> Dict[str, str]:
-        drives = self.get_drives()
+    def find_games(self, on_found: Callable[[Dict[str, str]], None]) -> Dict[str, str]:
+        roots = [
+            f for drive in self.get_drives() for f in self.get_program_folders(drive)
+        ]
+        return scan_roots(roots, self.cache, on_found)
+
+    def get_drives(self) -> List[str]:
+        """
+        Returns
+        -------
+        List[str]
+            List containing all drives on the system (e.g. "C:", "D:").
+        """
+        return [f"{d}:\\" for d in string.ascii_uppercase if os.path.exists(f"{d}:\\")]
+
+    def get_program_folders(self, drive: str) -> List[str]:
+        try:
+            with os.scandir(drive) as it:
+                return [
+                    e.path
+                    for e in it
+                    if "program files" in e.name.lower() and e.is_dir()
+                ]
+        except OSError:
+            return []
+
+
+class LinuxGameFinder(GameFinder):
+    """
+    Finds games on Linux by reading the metadata kept by launchers, rather than searching folders.
+
+    Supports Steam (including the Flatpak version and games running through Proton), Heroic and Lutris.
+    """
+
+    # Steam installs these alongside games, but they aren't games.
+    steam_tools = (
+        "Proton",
+        "Steam Linux Runtime",
+        "Steamworks Common Redistributables",
+    )
+
+    def __init__(self, cache: DiscoveryCache.DiscoveryCache = None, home: str = None):
+        super().__init__(cache)
+        self.home = home or os.path.expanduser("~")
+
+    def find_games(self, on_found: Callable[[Dict[str, str]], None]) -> Dict[str, str]:
         games = {}
 
-        for drive in drives:
-            if folders := self.get_program_folders(drive):
-                for program_files_folder in folders:
-                    for possible_library_folder in [
-                        join(program_files_folder, f)
-                        for f in os.listdir(program_files_folder)
-                    ]:
+        try:
+            games.update(self.find_library_games(on_found))
+        except Exception as e:
+            logging.error(f"Error finding games in the scan roots: {e}")
 
-                        for analyser in LibraryAnalyser.get_all():
-                            if found := analyser.find_games(possible_library_folder):
-                                games = {**games, **found}
+        for finder in (
+            self.find_steam_games,
+            self.find_heroic_games,
+            self.find_lutris_games,
+        ):
+            try:
+                found = finder()
+            except Exception as e:
+                logging.error(f"Error finding games with {finder.__name__}: {e}")
+                continue
+
+            games.update(found)
+            on_found(found)
 
         return games
 
-    def get_drives(self) -> List[str]:
+    def find_library_games(
+        self, on_found: Callable[[Dict[str, str]], None]
+    ) -> Dict[str, str]:
+        # There's no standard place for games on Linux, so only scan the roots chosen by the user.
+        return scan_roots([], self.cache, on_found)
+
+    def get_steam_roots(self) -> List[str]:
         """
         Returns
         -------
         List[str]
-            List containing all drives on the system (e.g. "C:", "D:").
+            List containing the folders where Steam is installed, for both the native and Flatpak versions.
         """
-        return [f"{d}:\\" for d in string.ascii_uppercase if os.path.exists(f"{d}:\\")]
+        candidates = [
+            join(self.home, ".steam", "steam"),
+            join(self.home, ".steam", "root"),
+            join(self.home, ".local", "share", "Steam"),
+            join(
+                self.home,
+                ".var",
+                "app",
+                "com.valvesoftware.Steam",
+                ".local",
+                "share",
+                "Steam",
+            ),
+            join(self.home, ".var", "app", "com.valvesoftware.Steam", "data", "Steam"),
+        ]
 
-    def get_program_folders(self, drive: str) -> List[str]:
-        out = []
+        return _unique_dirs(candidates)
+
+    def get_steam_libraries(self) -> List[str]:
+        """
+        Returns
+        -------
+        List[str]
+            List containing every Steam library folder, read from each Steam installation's "libraryfolders.vdf".
+        """
+        libraries = []
+
+        for root in self.get_steam_roots():
+            libraries.append(root)
+            path = join(root, "steamapps", "libraryfolders.vdf")
+
+            if not os.path.exists(path):
+                continue
+
+            data = vdf.load(path).get("libraryfolders", {})
+            for key, value in data.items():
+                if not key.isdigit():
+                    continue
+
+                # Newer versions of Steam store a section for each library; older versions only store the path.
+                libraries.append(
+                    value.get("path") if isinstance(value, dict) else value
+                )
+
+        return _unique_dirs([l for l in libraries if l])
+
+    def find_steam_games(self) -> Dict[str, str]:
+        games = {}
+
+        for library in self.get_steam_libraries():
+            steamapps = join(library, "steamapps")
+
+            # Installing a game adds a manifest, which changes the modification time of "steamapps".
+            found, prefixes = self.lookup(
+                steamapps,
+                lambda: (
+                    list(self.read_steam_library(steamapps)),
+                    [
+                        steamapps,
+                        join(steamapps, "common"),
+                        join(steamapps, "compatdata"),
+                    ],
+                ),
+            )
+
+            games.update(found)
+            self.proton_prefixes.update(prefixes)
+
+        return games
+
+    def read_steam_library(
+        self, steamapps: str
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        Reads the manifests for the games in a Steam library.
+
+        Parameters
+        ----------
+        steamapps : str
+            The path to the library's "steamapps" folder.
+
+        Returns
+        -------
+        Tuple[Dict[str, str], Dict[str, str]]
+            The paths to the games mapped to their names, and the paths to the games mapped to their Proton prefixes.
+        """
+        games, prefixes = {}, {}
+
+        for manifest in glob.glob(join(steamapps, "appmanifest_*.acf")):
+            try:
+                app = vdf.load(manifest).get("appstate", {})
+            except (OSError, vdf.VDFParsingException) as e:
+                logging.error(f"Could not read {manifest}: {e}")
+                continue
+
+            name = app.get("name")
+            installdir = app.get("installdir")
+
+            if not name or not installdir or name.startswith(self.steam_tools):
+                continue
+
+            path = join(steamapps, "common", installdir)
+            if not os.path.isdir(path):
+                continue
+
+            games[path] = name
+
+            # Windows games running through Proton keep their files in a separate Wine prefix.
+            prefix = join(steamapps, "compatdata", app.get("appid", ""), "pfx")
+            if app.get("appid") and os.path.isdir(prefix):
+                prefixes[path] = prefix
+
+        return games, prefixes
+
+    def find_heroic_games(self) -> Dict[str, str]:
+        games = {}
+
+        for config in _unique_dirs(
+            [
+                join(self.home, ".config", "heroic"),
+                join(
+                    self.home,
+                    ".var",
+                    "app",
+                    "com.heroicgameslauncher.hgl",
+                    "config",
+                    "heroic",
+                ),
+            ]
+        ):
+            # Epic Games, installed through Legendary.
+            legendary = join(config, "legendaryConfig", "legendary", "installed.json")
+            if os.path.exists(legendary):
+                games.update(
+                    self.lookup(
+                        legendary, lambda: (_read_legendary(legendary), [legendary])
+                    )
+                )
+
+            # GOG games. These don't store the title, so use the folder name as on Windows.
+            gog = join(config, "gog_store", "installed.json")
+            if os.path.exists(gog):
+                games.update(self.lookup(gog, lambda: (_read_gog(gog), [gog])))
+
+        return games
+
+    def find_lutris_games(self) -> Dict[str, str]:
+        games = {}
+
+        for db in (
+            join(self.home, ".local", "share", "lutris", "pga.db"),
+            join(
+                self.home,
+                ".var",
+                "app",
+                "net.lutris.Lutris",
+                "data",
+                "lutris",
+                "pga.db",
+            ),
+        ):
+            if os.path.exists(db):
+                games.update(self.lookup(db, lambda: (_read_lutris(db), [db])))
+
+        return games
+
+
+def scan_roots(
+    roots: List[str],
+    cache: DiscoveryCache.DiscoveryCache = None,
+    on_found: Callable[[Dict[str, str]], None] = None,
+) -> Dict[str, str]:
+    """
+    Scans folders for game libraries, along with the extra scan roots chosen in the settings.
+
+    Parameters
+    ----------
+    roots : List[str]
+        The default scan roots for the platform.
+    cache : DiscoveryCache.DiscoveryCache, optional
+        Cache holding the games found in each root.
+    on_found : Callable[[Dict[str, str]], None], optional
+        Function to call with games as soon as they are found.
+
+    Returns
+    -------
+    Dict[str, str]
+        Dictionary whose keys are the paths to possible discovered games, and whose corresponding values are the
+        names of the games.
+    """
+    prefs = settings.get_instance()
+    scanner = LibraryScanner(
+        roots + prefs.scan_roots,
+        workers=prefs.scan_workers or None,
+        time_budget=prefs.scan_time_budget or None,
+        cache=cache,
+        on_found=on_found,
+    )
+
+    return scanner.scan()
+
+
+def _ignore(games: Dict[str, str]) -> None:
+    pass
+
+
+def _read_legendary(path: str) -> Dict[str, str]:
+    games = {}
+
+    for app in _load_json(path, {}).values():
+        if (game := app.get("install_path")) and os.path.isdir(game):
+            games[game] = app.get("title") or os.path.basename(game)
+
+    return games
+
+
+def _read_gog(path: str) -> Dict[str, str]:
+    games = {}
+
+    for app in _load_json(path, {}).get("installed", []):
+        if (game := app.get("install_path")) and os.path.isdir(game):
+            games[game] = os.path.basename(game)
+
+    return games
+
+
+def _read_lutris(path: str) -> Dict[str, str]:
+    # Open read-only, since Lutris may be running.
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as conn:
+        rows = conn.execute(
+            "SELECT name, directory FROM games WHERE installed = 1 AND directory != ''"
+        ).fetchall()
+
+    return {game: name for name, game in rows if game and os.path.isdir(game)}
+
+
+def _unique_dirs(paths: List[str]) -> List[str]:
+    """
+    Removes paths which don't exist or point to the same folder as an earlier path, e.g. through a symlink.
+    """
+    out, seen = [], set()
+
+    for p in paths:
+        if not os.path.isdir(p):
+            continue
+
+        real = os.path.realpath(p)
+        if real not in seen:
+            seen.add(real)
+            out.append(p)
+
+    return out
 
-        for f in os.listdir(drive):
-            if "program files" in f.lower():
-                out.append(join(drive, f))
 
-        return out
+def _load_json(path: str, default: Any) -> Any:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
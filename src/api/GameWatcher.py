@@ -0,0 +1,246 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from api.GameFinder import GameFinder
+from api.Platform import Platform
+
+# Flags from <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_event = struct.Struct("iIII")
+
+
+class Inotify:
+    """
+    Minimal wrapper around the Linux inotify API, using ctypes so no extra packages are needed.
+    """
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        self._libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self) -> List[Tuple[int, int]]:
+        """
+        :return: the watch descriptors and masks of the events waiting to be read
+        """
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events, offset = [], 0
+        while offset + _event.size <= len(data):
+            wd, mask, _, length = _event.unpack_from(data, offset)
+            events.append((wd, mask))
+            offset += _event.size + length
+
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def is_supported() -> bool:
+    return Platform.get() is Platform.LINUX
+
+
+class GameWatcher:
+    """
+    Watches the folders games were discovered in, and discovers games again when they change, so games which
+    are installed or uninstalled while Switcher is open are noticed straight away.
+
+    The folders come from the GameFinder's DiscoveryCache, so only the roots which changed are scanned again.
+    Events are coalesced: discovery runs once the folders have been quiet for `delay` seconds, so installing a
+    game with thousands of files produces one update.
+    """
+
+    mask = (
+        IN_CREATE
+        | IN_DELETE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CLOSE_WRITE
+        | IN_DELETE_SELF
+        | IN_MOVE_SELF
+    )
+
+    def __init__(
+        self,
+        finder: GameFinder,
+        callback: Callable[[Dict[str, str], List[str]], None],
+        delay: float = 2.0,
+        max_delay: float = 60.0,
+    ):
+        """
+        :param finder: the GameFinder used to discover games, which must have a cache
+        :param callback: function called from the watcher's thread with the games which were added (paths mapped
+            to names) and the paths to the games which were removed
+        :param delay: seconds without any events to wait before discovering games again
+        :param max_delay: the longest time to wait, if events keep arriving
+        """
+        self.finder = finder
+        self.callback = callback
+        self.delay = delay
+        self.max_delay = max_delay
+
+        self.games: Dict[str, str] = {}
+        # The number of times games have been discovered again because of events.
+        self.updates = 0
+
+        self._inotify: Optional[Inotify] = None
+        self._watches: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self, games: Dict[str, str]) -> None:
+        """
+        Starts watching in a background thread.
+
+        :param games: the games which have already been discovered
+        """
+        if self._thread or not self.finder.cache:
+            return
+
+        self.games = dict(games)
+        self._inotify = Inotify()
+        self._update_watches()
+
+        self._thread = threading.Thread(
+            target=self._run, name="GameWatcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+            self._watches = {}
+
+    def _run(self) -> None:
+        first: Optional[float] = None
+        last: Optional[float] = None
+
+        while not self._stopped.is_set():
+            timeout = 1.0
+            if last is not None:
+                due = min(last + self.delay, first + self.max_delay)
+                timeout = max(0.0, min(timeout, due - time.monotonic()))
+
+            ready, _, _ = select.select([self._inotify.fd], [], [], timeout)
+
+            if ready and (events := self._inotify.read()):
+                self._forget_removed(events)
+
+                last = time.monotonic()
+                first = first or last
+                continue
+
+            if last is not None and time.monotonic() >= min(
+                last + self.delay, first + self.max_delay
+            ):
+                first = last = None
+                self._discover()
+
+    def _forget_removed(self, events: List[Tuple[int, int]]) -> None:
+        # The kernel removes the watch when a folder is deleted, so it needs to be added again if the folder returns.
+        removed = {wd for wd, mask in events if mask & IN_IGNORED}
+
+        if removed:
+            self._watches = {
+                f: wd for f, wd in self._watches.items() if wd not in removed
+            }
+
+    def _discover(self) -> None:
+        try:
+            games = self.finder.discover()
+        except Exception as e:
+            logging.error(f"Could not discover games after a change: {e}")
+            return
+
+        added = {p: n for p, n in games.items() if p not in self.games}
+        removed = [p for p in self.games if p not in games]
+
+        self.games = games
+        self._update_watches()
+
+        if added or removed:
+            self.updates += 1
+            logging.info(
+                f"Games changed: added {list(added.values())}, removed {removed}."
+            )
+            self.callback(added, removed)
+
+    def _update_watches(self) -> None:
+        folders: Set[str] = set()
+
+        for path in self.finder.cache.watched_paths():
+            # Files such as launchers' manifests are watched through the folder containing them.
+            folders.add(path if os.path.isdir(path) else os.path.dirname(path))
+
+        for folder in [f for f in self._watches if f not in folders]:
+            self._inotify.rm_watch(self._watches.pop(folder))
+
+        for folder in folders:
+            if folder not in self._watches and os.path.isdir(folder):
+                try:
+                    self._watches[folder] = self._inotify.add_watch(folder, self.mask)
+                except OSError as e:
+                    logging.warning(f"Could not watch {folder} for new games: {e}")
@@ -0,0 +1,166 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from os import path
+from typing import Dict, Optional, Set
+
+import aiohttp
+
+from api import files
+from utils import settings
+
+_fetcher: "HeaderFetcher" = None
+
+
+def get_instance() -> "HeaderFetcher":
+    global _fetcher
+
+    if not _fetcher:
+        _fetcher = HeaderFetcher()
+
+    return _fetcher
+
+
+class HeaderFetcher:
+    """
+    Downloads header images without blocking the event loop.
+
+    Images are downloaded with one shared aiohttp session, limited to `connections` at a time, and saved to a cache
+    folder so they're only downloaded once. Asking for an image which is already being downloaded waits for that
+    download rather than starting another one.
+    """
+
+    timeout = 30  # Seconds allowed for each download.
+    chunk_size = 64 * 1024
+
+    def __init__(self, folder: str = None, connections: int = None):
+        """
+        :param folder: the folder to cache images in
+        :param connections: the maximum number of simultaneous downloads
+        """
+        self.folder = folder or files.headers_path()
+        self.connections = connections or settings.get_instance().header_connections
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._pending: Dict[str, asyncio.Future] = {}
+        # URLs which failed to download, so they aren't retried every time a widget is redrawn.
+        self._failed: Set[str] = set()
+
+    def cached_path(self, url: str) -> str:
+        """
+        :param url: the URL of an image
+        :return: the path which the image is cached at, whether or not it has been downloaded
+        """
+        ext = path.splitext(url.rsplit("/", 1)[-1])[1] or ".jpg"
+        name = hashlib.sha1(url.encode()).hexdigest()
+        return path.join(self.folder, f"{name}{ext}")
+
+    async def fetch(self, url: str) -> Optional[str]:
+        """
+        Gets an image, downloading it first if it isn't cached.
+
+        :param url: the URL of the image
+        :return: the path to the image, or None if it could not be downloaded
+        """
+        filepath = self.cached_path(url)
+
+        if path.exists(filepath):
+            return filepath
+
+        if url in self._failed:
+            return None
+
+        if url not in self._pending:
+            task = asyncio.ensure_future(self._download(url, filepath))
+            task.add_done_callback(lambda t: self._forget(url, t))
+            self._pending[url] = task
+
+        # Shielded, so a widget which stops waiting doesn't cancel the download for others.
+        return await asyncio.shield(self._pending[url])
+
+    def _forget(self, url: str, task: asyncio.Future) -> None:
+        # A newer download of the same image may have started since this one was cancelled.
+        if self._pending.get(url) is task:
+            del self._pending[url]
+
+    async def _download(self, url: str, filepath: str) -> Optional[str]:
+        _, semaphore = self._get_session()
+
+        async with semaphore:
+            # The session may have been replaced while waiting.
+            session, _ = self._get_session()
+            logging.info(f"Downloading header image from {url}")
+
+            # Write to a temporary file first, so an interrupted download is never mistaken for a cached image.
+            fd, temp = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    async with session.get(url) as response:
+                        response.raise_for_status()
+
+                        async for chunk in response.content.iter_chunked(
+                            self.chunk_size
+                        ):
+                            file.write(chunk)
+
+                os.replace(temp, filepath)
+                return filepath
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                logging.warning(f"Could not download header image from {url}: {e}")
+                self._failed.add(url)
+                return None
+            except RuntimeError as e:
+                # The session was closed during the download. The image is downloaded again next time it's needed.
+                logging.warning(f"Could not download header image from {url}: {e}")
+                return None
+            finally:
+                if path.exists(temp):
+                    os.remove(temp)
+
+    def _get_session(self):
+        loop = asyncio.get_event_loop()
+
+        # The session and semaphore belong to the event loop they were created on.
+        if self._session is None or self._loop is not loop:
+            self._loop = loop
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._semaphore = asyncio.Semaphore(self.connections)
+
+        return self._session, self._semaphore
+
+    async def close(self) -> None:
+        """
+        Closes the session, cancelling any downloads still in progress.
+        """
+        pending = list(self._pending.values())
+        self._pending.clear()
+
+        for task in pending:
+            task.cancel()
+
+        # Cleared before closing, so requests made meanwhile, e.g. by a restarted window, get a new session.
+        if session := self._session:
+            self._session = None
+            await session.close()
@@ -18,22 +18,30 @@ from abc import ABC, abstractmethod
 from os.path import join
 from typing import Dict, Tuple
 
+_analysers = None
+
 
 def get_all() -> Tuple["LibraryAnalyser", ...]:
     """
-    Gets all the library analysers which have been implemented.
+    Gets all the library analysers which have been implemented. The analysers don't hold any state,
+    so the same instances are shared between scans.
 
     Returns
     -------
     Tuple[LibraryAnalyser, ...]
         Tuple containing all LibraryAnalysers available.
     """
-    return (
-        SteamLibraryAnalyser(),
-        UbisoftLibraryAnalyser(),
-        GOGLibraryAnalyser(),
-        EpicLibraryAnalyser(),
-    )
+    global _analysers
+
+    if _analysers is None:
+        _analysers = (
+            SteamLibraryAnalyser(),
+            UbisoftLibraryAnalyser(),
+            GOGLibraryAnalyser(),
+            EpicLibraryAnalyser(),
+        )
+
+    return _analysers
 
 
 class LibraryAnalyser(ABC):
@@ -57,16 +65,20 @@ class LibraryAnalyser(ABC):
             Dictionary whose keys are the absolute paths to the games, and whose values are
             the name of the game folders.
         """
-        games_folder = self.get_game_folder(folder_in_program_files)
         games = {}
 
-        if self.is_correct_launcher(folder_in_program_files) and os.path.exists(
-            games_folder
-        ):
-            for f in [join(games_folder, i) for i in os.listdir(games_folder)]:
-                if not self.is_empty(f):
-                    _, name = os.path.split(f)
-                    games[f] = name
+        # Checking the name is cheap, so do it before touching the disk.
+        if not self.is_correct_launcher(folder_in_program_files):
+            return games
+
+        games_folder = self.get_game_folder(folder_in_program_files)
+        if not os.path.isdir(games_folder):
+            return games
+
+        with os.scandir(games_folder) as it:
+            for entry in it:
+                if entry.is_dir() and not self.is_empty(entry.path):
+                    games[entry.path] = entry.name
 
         return games
 
@@ -117,7 +129,8 @@ class LibraryAnalyser(ABC):
         bool
             Whether the folder is empty.
         """
-        return not bool(os.listdir(folder))
+        with os.scandir(folder) as it:
+            return next(it, None) is None
 
 
 class SteamLibraryAnalyser(LibraryAnalyser):
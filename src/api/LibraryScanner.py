@@ -0,0 +1,217 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from api import LibraryAnalyser
+from api.DiscoveryCache import DiscoveryCache
+
+
+class LibraryScanner:
+    """
+    Finds games inside a set of scan roots, such as the "Program Files" folders on Windows.
+
+    Every folder inside a root is a possible library folder, which is checked by each LibraryAnalyser. Roots and
+    library folders are checked concurrently, since most of the time is spent waiting for the disk.
+    """
+
+    def __init__(
+        self,
+        roots: List[str],
+        workers: int = None,
+        time_budget: float = None,
+        analysers: Tuple[LibraryAnalyser.LibraryAnalyser, ...] = None,
+        cache: DiscoveryCache = None,
+        on_found: Callable[[Dict[str, str]], None] = None,
+    ):
+        """
+        Parameters
+        ----------
+        roots : List[str]
+            The folders to scan. Roots which don't exist are ignored.
+        workers : int, optional
+            The number of threads to scan with. Chosen automatically if not given.
+        time_budget : float, optional
+            The maximum number of seconds a scan may take. When it runs out, the scan returns the games found so far.
+        analysers : Tuple[LibraryAnalyser, ...], optional
+            The analysers used to check each library folder. Defaults to all of them.
+        cache : DiscoveryCache, optional
+            Cache holding the games found in each root, so roots which haven't changed aren't scanned again.
+        on_found : Callable[[Dict[str, str]], None], optional
+            Function called from the scanning threads with the games found in each library folder, as soon as they
+            are found.
+        """
+        self.roots = list(dict.fromkeys(roots))
+        self.workers = workers or min(32, (os.cpu_count() or 4) * 2)
+        self.time_budget = time_budget
+        self.analysers = analysers or LibraryAnalyser.get_all()
+        self.cache = cache
+        self.on_found = on_found
+
+        # Whether the last scan ran out of time before checking every folder.
+        self.timed_out = False
+
+        self._games: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._finished = threading.Event()
+        self._deadline: Optional[float] = None
+
+    def scan(self) -> Dict[str, str]:
+        """
+        Scans all the roots.
+
+        Returns
+        -------
+        Dict[str, str]
+            Dictionary whose keys are the paths to possible discovered games, and whose corresponding values are the
+            names of the games.
+        """
+        self._games = {}
+        self._pending = 0
+        self._finished.clear()
+        self._deadline = (
+            time.monotonic() + self.time_budget if self.time_budget else None
+        )
+        self.timed_out = False
+
+        roots = [r for r in self.roots if os.path.isdir(r)]
+        if not roots:
+            return {}
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for root in roots:
+                self._submit(executor, self._scan_root, executor, root)
+
+            if not self._finished.wait(self.time_budget):
+                self.timed_out = True
+        finally:
+            # Tasks still queued return immediately once the time budget has run out.
+            executor.shutdown(wait=not self.timed_out)
+
+        if self.timed_out:
+            logging.warning(
+                f"Scanning for games took longer than {self.time_budget}s, so it was stopped early."
+            )
+
+        with self._lock:
+            return dict(self._games)
+
+    def _submit(self, executor: ThreadPoolExecutor, target, *args) -> None:
+        with self._lock:
+            self._pending += 1
+
+        try:
+            executor.submit(self._run, target, *args)
+        except RuntimeError:
+            # The executor has been shut down because the scan ran out of time.
+            self._task_done()
+
+    def _run(self, target, *args) -> None:
+        try:
+            if self._out_of_time():
+                self.timed_out = True
+            else:
+                target(*args)
+        except OSError as e:
+            logging.debug(f"Could not scan {args[-1]}: {e}")
+        finally:
+            self._task_done()
+
+    def _task_done(self) -> None:
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self._finished.set()
+
+    def _out_of_time(self) -> bool:
+        return self._deadline is not None and time.monotonic() > self._deadline
+
+    def _scan_root(self, executor: ThreadPoolExecutor, root: str) -> None:
+        if self.cache and (cached := self.cache.get(root)) is not None:
+            self._merge(cached)
+            return
+
+        with os.scandir(root) as it:
+            libraries = [e.path for e in it if e.is_dir()]
+
+        scan = _RootScan(root, libraries)
+        if not libraries:
+            self._finish_root(scan)
+
+        for library in libraries:
+            self._submit(executor, self._scan_library, scan, library)
+
+    def _scan_library(self, scan: "_RootScan", library: str) -> None:
+        games, watched = {}, []
+        complete = False
+
+        try:
+            for analyser in self.analysers:
+                if analyser.is_correct_launcher(library):
+                    # Installing or removing a game changes the modification time of the folder containing the games.
+                    watched.append(analyser.get_game_folder(library))
+
+                    if found := analyser.find_games(library):
+                        games.update(found)
+
+            complete = True
+        finally:
+            self._merge(games)
+
+            with self._lock:
+                scan.games.update(games)
+                scan.watched.extend(watched)
+                scan.pending -= 1
+                scan.complete = scan.complete and complete
+                finished = scan.pending == 0
+
+            if finished:
+                self._finish_root(scan)
+
+    def _finish_root(self, scan: "_RootScan") -> None:
+        # A root with a library which couldn't be scanned is scanned again next time, rather than its partial
+        # results being cached.
+        if self.cache and scan.complete:
+            self.cache.put(scan.root, scan.games, scan.watched)
+
+    def _merge(self, games: Dict[str, str]) -> None:
+        if games:
+            with self._lock:
+                self._games.update(games)
+
+            if self.on_found:
+                self.on_found(games)
+
+
+class _RootScan:
+    """
+    The progress of scanning a root whose library folders are being checked concurrently.
+    """
+
+    def __init__(self, root: str, libraries: List[str]):
+        self.root = root
+        self.pending = len(libraries)
+        self.games: Dict[str, str] = {}
+        # Whether every library folder was scanned without errors.
+        self.complete = True
+        # Adding or removing a library folder changes the modification time of the root.
+        self.watched: List[str] = [root, *libraries]
@@ -0,0 +1,249 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import hashlib
+import os
+import uuid
+from os.path import join
+from typing import Dict, Optional, Iterable, Set, Union
+
+from api import files, fastcopy, archive
+from api.archive import ArchiveReader
+from utils import serialization
+
+_store: "ObjectStore" = None
+
+
+def get_instance() -> "ObjectStore":
+    global _store
+
+    if not _store:
+        _store = ObjectStore(files.objects_path())
+
+    return _store
+
+
+class ObjectStore:
+    """
+    Content-addressed store for the files belonging to profiles.
+
+    Every file is stored once, as a blob named after the SHA-256 hash of its contents, no matter how many
+    profiles contain it. Profiles refer to blobs through a tree manifest, and each blob keeps a count of the
+    profiles referring to it so it can be deleted when it is no longer used.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._refs_path = join(folder, "refs.yaml")
+        self._refs: Dict[str, int] = None
+
+    def blob_path(self, digest: str) -> str:
+        return join(self.folder, digest[:2], digest[2:])
+
+    def put(self, filepath: str) -> Dict:
+        """
+        Adds a file to the store. If a blob with the same contents already exists, it is reused.
+
+        :param filepath: the path to the file to add
+        :return: the entry describing the file, for use in a tree manifest
+        """
+        stat = os.stat(filepath)
+
+        # The file is copied before hashing, so the blob always matches its name even if the game
+        # modifies the file while the profile is being saved.
+        temp = join(self.folder, f".{uuid.uuid4()}.tmp")
+        fastcopy.copyfile(filepath, temp)
+
+        try:
+            digest = self.digest(temp)
+            blob = self.blob_path(digest)
+
+            if os.path.exists(blob):
+                os.remove(temp)
+            else:
+                try:
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    os.replace(temp, blob)
+                except FileNotFoundError:
+                    # The shard folder was removed by a concurrent release, after its last blob was deleted.
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    os.replace(temp, blob)
+        except Exception as e:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise e
+
+        return {"hash": digest, "size": stat.st_size, "mtime": stat.st_mtime}
+
+    def digest(self, filepath: str) -> str:
+        """
+        :return: the SHA-256 hash of a file's contents, which is used as the name of its blob
+        """
+        return _sha256(filepath)
+
+    def restore(self, entry: Dict, filepath: str) -> None:
+        """
+        Copies a blob to a location outside the store.
+
+        :param entry: the entry describing the file, from a tree manifest
+        :param filepath: the path to copy the file to
+        """
+        fastcopy.copyfile(self.blob_path(entry["hash"]), filepath)
+        os.utime(filepath, (entry["mtime"], entry["mtime"]))
+
+    def retain(self, digests: Iterable[str]) -> None:
+        """
+        Adds a reference to each blob.
+        """
+        refs = self._load_refs()
+        for d in digests:
+            refs[d] = refs.get(d, 0) + 1
+
+        self._save_refs()
+
+    def release(self, digests: Iterable[str]) -> None:
+        """
+        Removes a reference from each blob, deleting the blobs which are no longer referenced.
+        """
+        refs = self._load_refs()
+        for d in digests:
+            count = refs.get(d, 0) - 1
+
+            if count > 0:
+                refs[d] = count
+            else:
+                refs.pop(d, None)
+                self._remove_blob(d)
+
+        self._save_refs()
+
+    def prune(self, digests: Iterable[str]) -> None:
+        """
+        Deletes any of the blobs which are not referenced, e.g. after a profile failed to save.
+        """
+        refs = self._load_refs()
+        for d in digests:
+            if not refs.get(d):
+                self._remove_blob(d)
+
+    def _remove_blob(self, digest: str) -> None:
+        blob = self.blob_path(digest)
+
+        try:
+            os.remove(blob)
+        except FileNotFoundError:
+            pass
+
+        # Remove the shard folder too once its last blob has gone.
+        try:
+            os.rmdir(os.path.dirname(blob))
+        except OSError:
+            pass
+
+    def _load_refs(self) -> Dict[str, int]:
+        if self._refs is None:
+            try:
+                self._refs = serialization.load(self._refs_path) or {}
+            except FileNotFoundError:
+                self._refs = {}
+
+        return self._refs
+
+    def _save_refs(self) -> None:
+        serialization.dump(self._refs, self._refs_path)
+
+
+class Tree:
+    """
+    Manifest listing the files in a profile, as references to blobs in the object store.
+    """
+
+    filename = "tree.yaml"
+
+    def __init__(self, items: Dict = None, path: str = None):
+        self.items: Dict[str, Dict] = items or {}
+        self.path = path
+
+        self._archive: ArchiveReader = None
+
+    def digests(self) -> Set[str]:
+        out = set()
+
+        for item in self.items.values():
+            if item.get("archived"):
+                continue
+            elif item["type"] == "dir":
+                out.update(e["hash"] for e in item["files"].values())
+            else:
+                out.add(item["entry"]["hash"])
+
+        return out
+
+    def size(self) -> int:
+        """
+        :return: the total size of the files in the manifest, in bytes
+        """
+        size = 0
+
+        for item in self.items.values():
+            if item["type"] == "dir":
+                size += sum(e["size"] for e in item["files"].values())
+            else:
+                size += item["entry"]["size"]
+
+        return size
+
+    def save(self, path: str) -> None:
+        serialization.dump({"items": self.items}, join(path, Tree.filename))
+
+    @staticmethod
+    def load(path: str) -> Optional["Tree"]:
+        """
+        Loads the tree manifest for a profile.
+
+        :param path: the path to the profile
+        :return: the tree manifest, or None if the profile was saved before the object store existed
+        """
+        try:
+            data = serialization.load(join(path, Tree.filename)) or {}
+        except FileNotFoundError:
+            return None
+
+        return Tree(data.get("items"), path)
+
+    def source(
+        self, item: Dict, store: ObjectStore
+    ) -> Union[ObjectStore, ArchiveReader]:
+        """
+        :return: where the files for an item can be restored from
+        """
+        if not item.get("archived"):
+            return store
+
+        if not self._archive:
+            self._archive = ArchiveReader(join(self.path, archive.filename))
+
+        return self._archive
+
+
+def _sha256(filepath: str) -> str:
+    sha256 = hashlib.sha256()
+    bs = 1024 * 1024
+
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(bs), b""):
+            sha256.update(block)
+
+    return sha256.hexdigest()
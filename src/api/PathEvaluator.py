@@ -83,5 +83,31 @@ class LinuxEvaluator(NixEvaluator):
     pass
 
 
+class ProtonEvaluator(PathEvaluator):
+    """
+    Evaluates paths inside the Wine prefix of a Windows game running through Proton.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+
+    def home(self) -> str:
+        return join(self.prefix, "drive_c", "users", "steamuser")
+
+    def username(self) -> str:
+        return "steamuser"
+
+    def documents(self) -> str:
+        # Older versions of Proton use "My Documents".
+        for name in ("Documents", "My Documents"):
+            if os.path.isdir(path := join(self.home(), name)):
+                return path
+
+        return join(self.home(), "Documents")
+
+    def desktop(self) -> str:
+        return join(self.home(), "Desktop")
+
+
 class MacEvaluator(NixEvaluator):
     pass
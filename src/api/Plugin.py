@@ -24,13 +24,13 @@ from os import path
 from typing import Dict, Optional, final, List, Any
 
 import requests
-import yaml
 
-from api import files
+from api import files, ObjectStore, HeaderFetcher
 from api.Keys import Keys
 from api.Launcher import Launcher
 from api.Platform import Platform
 from api.profiles import ProfileType, Profile
+from utils import serialization, settings
 
 
 class Plugin(ABC):
@@ -45,6 +45,8 @@ class Plugin(ABC):
         self.initialise()
 
         self.game_path: str = None
+        # The Wine prefix of the game, if it is a Windows game running through Proton.
+        self.proton_prefix: Optional[str] = None
 
     @abstractmethod
     def initialise(self) -> None:
@@ -89,6 +91,14 @@ class Plugin(ABC):
         """
         print(f"Applying profile '{profile.name}' from {path}...")
 
+    def rollback(self) -> bool:
+        """
+        Undoes the last profile which was applied, if possible.
+
+        :return: whether the previous settings were restored
+        """
+        return False
+
     def delete(self, profile: Profile, path: str) -> None:
         """
         Deletes a profile.
@@ -97,6 +107,10 @@ class Plugin(ABC):
         :param path: the path to the profile
         """
         print(f"Deleting profile at {path}...")
+
+        if tree := ObjectStore.Tree.load(path):
+            ObjectStore.get_instance().release(tree.digests())
+
         shutil.rmtree(path)
 
     def save_profile_yaml(self, profile: Profile, path: str) -> None:
@@ -104,16 +118,15 @@ class Plugin(ABC):
         Saves the YAML file for a profile.
         """
         out = profile.to_dict()
-        with open(os.path.join(path, "profile.yaml"), "w") as f:
-            yaml.safe_dump(out, f)
+        serialization.dump(out, os.path.join(path, "profile.yaml"))
 
     def load_profile_yaml(self, path: str) -> Profile:
         """
         Loads the YAML file for a profile.
         """
         try:
-            with open(os.path.join(path, "profile.yaml"), "r") as f:
-                return Profile.from_dict(yaml.safe_load(f))
+            data = serialization.load(os.path.join(path, "profile.yaml"))
+            return Profile.from_dict(data)
         except (FileNotFoundError, AttributeError) as e:
             _, tail = os.path.split(path)
             return Profile(uuid=tail)
@@ -125,6 +138,9 @@ class Plugin(ABC):
         profiles = []
 
         for folder in os.listdir(profile_dir):
+            if not os.path.isdir(os.path.join(profile_dir, folder)):
+                continue
+
             profile = self.load_profile_yaml(os.path.join(profile_dir, folder))
             profiles.append(profile)
 
@@ -145,8 +161,7 @@ class Plugin(ABC):
         folder_location = self.here()
         yaml_location = path.join(folder_location, "plugin.yaml")
 
-        with open(yaml_location, "r") as stream:
-            return yaml.safe_load(stream)
+        return serialization.load(yaml_location)
 
     @final
     async def get_header(self) -> Optional[str]:
@@ -164,7 +179,13 @@ class Plugin(ABC):
             name = items[stripped.index(header)]
             return path.join(self.here(), name)
 
-        return await self._download_header()
+        filepath = self._download_header()
+
+        # Plugins which override `_download_header` may return the path directly.
+        if inspect.isawaitable(filepath):
+            filepath = await filepath
+
+        return filepath
 
     async def _download_header(self) -> Optional[str]:
         """
@@ -172,12 +193,21 @@ class Plugin(ABC):
 
         :return: the absolute file path to the downloaded header image
         """
-        steam_id = int(self.get(Keys.STEAM_ID))
+        steam_id = self.get(Keys.STEAM_ID)
         if not steam_id:
             return None
 
-        url = f"http://cdn.akamai.steamstatic.com/steam/apps/{steam_id}/header.jpg"
-        return self._perform_download(url, "header")
+        url = settings.get_instance().header_url.format(steam_id=int(steam_id))
+        return await self._fetch_image(url)
+
+    async def _fetch_image(self, url: str) -> Optional[str]:
+        """
+        Downloads an image without blocking the event loop. Images are cached, so each is only downloaded once.
+
+        :param url: the URL of the image
+        :return: the absolute file path to the downloaded image, or None if it could not be downloaded
+        """
+        return await HeaderFetcher.get_instance().fetch(url)
 
     def _perform_download(self, url: str, filename: str, ext: str = "jpg") -> str:
         logging.info(f"Downloading header image from {url} as {filename}")
@@ -204,7 +234,7 @@ class Plugin(ABC):
         :param key: the key for an item, as a Keys enum
         :return: the path, after evaluating it to replace any variables
         """
-        return files.evaluate_path(self.get(key))
+        return files.evaluate_path(self.get(key), self.proton_prefix)
 
     def launch_game(self, launcher: Launcher) -> bool:
         """
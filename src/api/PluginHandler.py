@@ -17,24 +17,26 @@ import logging
 import os
 import shutil
 import sys
+import tempfile
 import uuid
 import zipfile
-from difflib import SequenceMatcher
-from io import BytesIO
 from os.path import join
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterable, BinaryIO
 
 import requests
-import yaml
 
-from api import files
+from api import files, fastcopy, PluginRegistry
 from api.CodelessPlugin import CodelessPlugin
 from api.Keys import Keys
 from api.Platform import Platform
 from api.Plugin import Plugin
+from api.PluginInstaller import PluginInstaller, get_zipball_url, chunk_size
+from api.PluginMatcher import PluginMatcher
+from api.ProfileCatalog import ProfileCatalog
+from api.SignatureIndex import SignatureIndex
 from api.files import make_path
 from api.profiles import Profile
-from utils import online
+from utils import online, serialization
 
 
 class PluginHandler:
@@ -48,14 +50,23 @@ class PluginHandler:
 
     def __init__(self):
         self.plugins: List[Plugin] = []
+        self.catalogs: Dict[str, ProfileCatalog] = {}
+        self.registry = PluginRegistry.get_instance(self._yaml_path())
+        self.signatures: Optional[SignatureIndex] = None
+        # Wine prefixes of games running through Proton, keyed by the paths to the games.
+        self.proton_prefixes: Dict[str, str] = {}
 
     def initialise(self) -> None:
-        data = self.load_yaml()
-        if not data.get("gamePaths"):
-            data["gamePaths"] = {}
+        # Find out how files can be copied to and from the object store, before any profiles are used.
+        fastcopy.probe(files.objects_path())
+
+        game_paths = self.registry.game_paths()
 
         for folder in os.listdir(self.plugins_folder):
-            if not os.path.isdir(join(self.plugins_folder, folder)):
+            # Hidden folders are plugins which are still being installed.
+            if folder.startswith(".") or not os.path.isdir(
+                join(self.plugins_folder, folder)
+            ):
                 continue
 
             plugin = None
@@ -73,7 +84,31 @@ class PluginHandler:
 
             if plugin:
                 self.plugins.append(plugin)
-                plugin.game_path = data.get("gamePaths").get(plugin.get_uid())
+                plugin.game_path = game_paths.get(plugin.get_uid())
+                plugin.proton_prefix = self.proton_prefixes.get(plugin.game_path)
+
+        self.signatures = SignatureIndex(self.plugins)
+
+    def assign_game_paths(self, folders: Iterable[str]) -> List[Plugin]:
+        """
+        Finds the games belonging to plugins which don't know where their game is, by checking the plugins'
+        verification paths against discovered game folders.
+
+        :param folders: the paths to the discovered game folders
+        :return: the plugins whose game paths were set
+        """
+        assigned = []
+
+        for folder, plugins in self.signatures.match_all(folders).items():
+            for plugin in plugins:
+                if plugin.game_path and os.path.isdir(plugin.game_path):
+                    continue
+
+                logging.info(f"Found the game for {plugin.get_uid()} at {folder}.")
+                self.save_game_path(folder, plugin)
+                assigned.append(plugin)
+
+        return assigned
 
     def import_plugin_module(self, folder: str) -> Optional[Plugin]:
         """
@@ -99,34 +134,94 @@ class PluginHandler:
             print(e)
             logging.error(e)
 
-    def apply_changes(self, changes: Dict[str, bool]) -> None:
+    def apply_changes(self, changes: Dict[str, bool]) -> List[str]:
+        """
+        Installs and uninstalls plugins.
+
+        :param changes: dictionary mapping the URL of each plugin to whether it should be installed or uninstalled
+        :return: the URLs of the plugins which could not be installed or uninstalled
+        """
         install = [key for key, value in changes.items() if value]
         uninstall = [key for key, value in changes.items() if not value]
 
-        for p in install:
-            self.install_plugin(p)
+        installer = PluginInstaller(self)
+        installer.run_in_thread(install, uninstall)
 
-        for p in uninstall:
-            self.uninstall_plugin(p)
+        return installer.failed
 
     def install_plugin(self, url: str) -> None:
-        zipball = f"{url}/zipball/master"
+        zipball = get_zipball_url(url)
         print(f"Downloading plugin from {zipball}")
 
-        request = requests.get(zipball)
-        zip = zipfile.ZipFile(BytesIO(request.content))
-        target = zip.namelist()[0]
+        with requests.get(
+            zipball, stream=True
+        ) as request, tempfile.TemporaryFile() as file:
+            request.raise_for_status()
+
+            for chunk in request.iter_content(chunk_size):
+                file.write(chunk)
+
+            self.extract_plugin(url, file)
 
-        zip.extractall(self.plugins_folder)
-        print(f"Downloaded plugin to {target}")
+    def extract_plugin(self, url: str, file: BinaryIO) -> None:
+        """
+        Installs a plugin from its downloaded zipball.
+
+        The plugin is extracted to a staging folder named after its package, which is renamed once extraction has
+        finished, so a partly extracted plugin is never loaded.
+
+        :param url: the URL of the plugin's repository
+        :param file: the zipball
+        """
+        with zipfile.ZipFile(file) as zip:
+            # GitHub puts the repository's files inside a folder named after the commit.
+            root = zip.namelist()[0].split("/")[0] + "/"
 
-        with open(join(self.plugins_folder, target, "plugin.yaml"), "r") as f:
-            data = yaml.safe_load(f)
+            data = serialization.loads(zip.read(f"{root}plugin.yaml").decode("utf-8"))
             dir_name = data[Keys.PACKAGE_NAME.value]
 
-        shutil.move(
-            join(self.plugins_folder, target), join(self.plugins_folder, dir_name)
-        )
+            target = join(self.plugins_folder, dir_name)
+            # Normalised the same way as the member paths below.
+            staging = os.path.normpath(
+                os.path.abspath(join(self.plugins_folder, f".{dir_name}.staging"))
+            )
+            if os.path.exists(staging):
+                shutil.rmtree(staging)
+
+            for info in zip.infolist():
+                relative = info.filename[len(root) :]
+                if not info.filename.startswith(root) or not relative:
+                    continue
+
+                path = os.path.normpath(join(staging, *relative.split("/")))
+                if os.path.commonpath([staging, path]) != staging or path == staging:
+                    raise PluginInstallException(
+                        f"Unsafe path in zipball: {info.filename}"
+                    )
+
+                if info.is_dir():
+                    os.makedirs(path, exist_ok=True)
+                    continue
+
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with zip.open(info) as src, open(path, "wb") as dst:
+                    shutil.copyfileobj(src, dst, chunk_size)
+
+        # Replace any previous version of the plugin.
+        if os.path.exists(target):
+            previous = join(self.plugins_folder, f".{dir_name}.previous")
+
+            # Left over if Switcher stopped during an earlier install, or it couldn't all be deleted.
+            if os.path.exists(previous):
+                shutil.rmtree(previous)
+
+            os.replace(target, previous)
+            os.replace(staging, target)
+            shutil.rmtree(previous, onerror=files.log_rmtree_error)
+        else:
+            os.replace(staging, target)
+
+        print(f"Downloaded plugin to {dir_name}")
         self.save_installed_plugin_url(url, dir_name)
 
     def dev_install_plugin(self, yaml_text: str) -> None:
@@ -152,52 +247,26 @@ class PluginHandler:
 
     async def suggest_plugins(self, games: Dict[str, str]) -> List[str]:
         trusted, _ = online.find_online_plugins()
-        threshold = 0.9
-
-        install = []
-        for plugin in trusted:
-            matches = []
-
-            for loc, game in games.items():
-                match = SequenceMatcher(None, plugin.game, game).ratio()
-                matches.append(match)
-
-                if match >= 1:
-                    break
-                elif (
-                    match < threshold
-                    and plugin.game in game
-                    or plugin.game.replace(":", "") in game.replace(":", "")
-                ):
-                    matches.append(threshold)
-
-            if max(matches) >= threshold:
-                install.append(plugin)
+        install = PluginMatcher(trusted).match(games.values())
 
         installed_plugin_urls = self.get_installed_plugin_urls()
         return [p.url for p in install if p.url not in installed_plugin_urls]
 
     def uninstall_plugin(self, url: str) -> None:
-        target = self.load_yaml()["urls"][url]
+        target = self.registry.urls()[url]
         shutil.rmtree(join(self.plugins_folder, target))
 
         self.save_uninstalled_plugin_url(url)
         print(f"Removed plugin at {target}.")
 
-    def get_installed_plugin_urls(self) -> List[str]:
-        return self.load_yaml().get("urls") or []
+    def get_installed_plugin_urls(self) -> Dict[str, str]:
+        return self.registry.urls()
 
     def save_installed_plugin_url(self, url: str, dir: str):
-        data = self.load_yaml()
-
-        data["urls"][url] = dir
-        self.save_yaml(data)
+        self.registry.set_url(url, dir)
 
     def save_uninstalled_plugin_url(self, url: str):
-        data = self.load_yaml()
-
-        del data["urls"][url]
-        self.save_yaml(data)
+        self.registry.remove_url(url)
 
     def save_game_path(self, path: str, plugin: Plugin) -> None:
         """
@@ -207,13 +276,19 @@ class PluginHandler:
         :param plugin: the plugin which handles the game
         """
         plugin.game_path = path
+        plugin.proton_prefix = self.proton_prefixes.get(path)
+        self.registry.set_game_path(plugin.get_uid(), path)
+
+    def set_proton_prefixes(self, prefixes: Dict[str, str]) -> None:
+        """
+        Sets the Proton prefixes of the plugins' games, so their paths are evaluated inside the prefix.
 
-        data = self.load_yaml()
-        if not data.get("gamePaths"):
-            data["gamePaths"] = {}
+        :param prefixes: dictionary mapping the paths to games to their Proton prefixes
+        """
+        self.proton_prefixes = dict(prefixes)
 
-        data["gamePaths"][plugin.get_uid()] = path
-        self.save_yaml(data)
+        for plugin in self.plugins:
+            plugin.proton_prefix = self.proton_prefixes.get(plugin.game_path)
 
     def _get_profile_path(self, plugin: Plugin, profile: Profile) -> str:
         base_plugin_profile_dir = make_path(
@@ -226,34 +301,43 @@ class PluginHandler:
         target_dir = self._get_profile_path(plugin, profile)
         plugin.save(profile, target_dir)
 
+        self._get_catalog(plugin).add(profile)
+
     def apply_profile(self, plugin: Plugin, profile: Profile) -> None:
         target_dir = self._get_profile_path(plugin, profile)
         plugin.apply(profile, target_dir)
 
+    def rollback_profile(self, plugin: Plugin) -> bool:
+        return plugin.rollback()
+
     def delete_profile(self, plugin: Plugin, profile: Profile) -> None:
         target_dir = self._get_profile_path(plugin, profile)
         plugin.delete(profile, target_dir)
 
+        self._get_catalog(plugin).remove(profile.uuid)
+
     def get_profiles(self, plugin: Plugin) -> List[Profile]:
+        """
+        Gets the profiles saved for a plugin, newest first.
+        """
         profile_dir = make_path(join(self.profiles_folder, plugin.get_uid()))
 
-        return plugin.get_profiles(profile_dir)
+        return self._get_catalog(plugin).list(lambda: plugin.get_profiles(profile_dir))
 
-    def load_yaml(self) -> Dict:
-        yaml_path = self._yaml_path()
-        if "plugins.yaml" not in os.listdir(self.plugins_folder):
-            with open(yaml_path, "w") as f:
-                data = {"urls": {}}
-                yaml.safe_dump(data, f)
+    def _get_catalog(self, plugin: Plugin) -> ProfileCatalog:
+        uid = plugin.get_uid()
 
-        with open(yaml_path, "r") as f:
-            return yaml.safe_load(f)
+        if uid not in self.catalogs:
+            profile_dir = make_path(join(self.profiles_folder, uid))
+            self.catalogs[uid] = ProfileCatalog(profile_dir)
 
-    def save_yaml(self, data: Dict) -> None:
-        with open(self._yaml_path(), "w") as f:
-            yaml.safe_dump(data, f)
+        return self.catalogs[uid]
 
     def _yaml_path(self) -> str:
         folder = self.plugins_folder
         yaml_file = join(folder, "plugins.yaml")
         return yaml_file
+
+
+class PluginInstallException(Exception):
+    pass
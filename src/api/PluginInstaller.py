@@ -0,0 +1,169 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import aiohttp
+
+from utils import settings
+
+chunk_size = 64 * 1024
+
+
+def get_zipball_url(url: str) -> str:
+    """
+    :param url: the URL of a plugin's repository
+    :return: the URL to download the plugin's zipball from
+    """
+    return f"{url}/zipball/master"
+
+
+class PluginInstaller:
+    """
+    Installs and uninstalls several plugins at once.
+
+    Zipballs are downloaded concurrently with aiohttp, limited to `connections` at a time, and extracted by a pool of
+    worker threads while the other downloads continue. Uninstalls run in the same pool alongside the installs. A
+    plugin failing to install doesn't stop the others.
+    """
+
+    timeout = 120  # Seconds allowed for each download.
+
+    def __init__(
+        self,
+        plugin_handler: "PluginHandler",
+        connections: int = None,
+        workers: int = None,
+    ):
+        """
+        :param plugin_handler: the PluginHandler which installs the plugins
+        :param connections: the maximum number of simultaneous downloads
+        :param workers: the number of threads to extract and uninstall plugins with
+        """
+        self.plugin_handler = plugin_handler
+        self.connections = connections or settings.get_instance().install_connections
+        self.workers = workers or 4
+
+        # URLs of the plugins which could not be installed or uninstalled.
+        self.failed: List[str] = []
+
+        self._progress: Callable[[int, int, Optional[str]], None] = None
+        self._done = 0
+        self._total = 0
+
+    async def run(
+        self,
+        install: List[str],
+        uninstall: List[str] = (),
+        progress: Callable[[int, int, Optional[str]], None] = None,
+    ) -> bool:
+        """
+        Installs and uninstalls plugins.
+
+        :param install: the URLs of the plugins to install
+        :param uninstall: the URLs of the plugins to uninstall
+        :param progress: function called with the number of plugins finished, the total number of plugins and the
+            URL of the plugin which started or finished; the URL is None once every plugin has finished
+        :return: whether every plugin was installed or uninstalled successfully
+        """
+        loop = asyncio.get_event_loop()
+        self._progress = progress or (lambda *args: None)
+        self._done = 0
+        self._total = len(install) + len(uninstall)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            connector = aiohttp.TCPConnector(limit=self.connections)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+            async with aiohttp.ClientSession(
+                connector=connector, timeout=timeout
+            ) as session:
+                tasks = [
+                    loop.run_in_executor(
+                        executor, self.plugin_handler.uninstall_plugin, url
+                    )
+                    for url in uninstall
+                ]
+                tasks += [self._install(session, executor, url) for url in install]
+
+                await asyncio.gather(
+                    *(
+                        self._finish(url, t)
+                        for url, t in zip([*uninstall, *install], tasks)
+                    )
+                )
+
+        self._progress(self._total, self._total, None)
+        return not self.failed
+
+    async def _install(
+        self, session: aiohttp.ClientSession, executor: ThreadPoolExecutor, url: str
+    ) -> None:
+        # Stream the zipball to a temporary file, so large plugins aren't held in memory.
+        with tempfile.TemporaryFile() as file:
+            async with session.get(get_zipball_url(url)) as response:
+                response.raise_for_status()
+                self._progress(self._done, self._total, url)
+
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    file.write(chunk)
+
+            await asyncio.get_event_loop().run_in_executor(
+                executor, self.plugin_handler.extract_plugin, url, file
+            )
+
+    async def _finish(self, url: str, task) -> None:
+        try:
+            await task
+        except Exception as e:
+            logging.error(f"Could not change plugin {url}: {e}")
+            self.failed.append(url)
+
+        self._done += 1
+        self._progress(self._done, self._total, url)
+
+    def run_in_thread(
+        self,
+        install: List[str],
+        uninstall: List[str] = (),
+        progress: Callable[[int, int, Optional[str]], None] = None,
+    ) -> bool:
+        """
+        Installs and uninstalls plugins from synchronous code, blocking until they have finished. The installer runs
+        on its own event loop in a separate thread, so it can be used while another event loop is running.
+
+        :return: whether every plugin was installed or uninstalled successfully
+        """
+        result = []
+
+        def target() -> None:
+            loop = asyncio.new_event_loop()
+            try:
+                result.append(
+                    loop.run_until_complete(self.run(install, uninstall, progress))
+                )
+            finally:
+                loop.close()
+
+        thread = threading.Thread(target=target, name="PluginInstaller")
+        thread.start()
+        thread.join()
+
+        return bool(result and result[0])
@@ -0,0 +1,184 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import logging
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, Iterable, List, Set
+
+# NumPy scores every plugin against a game at once; without it the same bounds are computed one plugin at a time.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+    logging.info("NumPy is not available; using the pure-Python plugin matcher.")
+
+
+class PluginMatcher:
+    """
+    Matches plugins to installed games by the names of their games.
+
+    A plugin matches a game if `SequenceMatcher.ratio` of the names is at least `threshold`, or if the plugin's game
+    name appears in the game's name (ignoring colons). Rather than comparing every plugin with every game, names are
+    indexed when the matcher is created:
+
+    - The number of times each character appears in each plugin's name is stored as a matrix. The characters shared
+      by two names give the same upper bound on the ratio as `SequenceMatcher.quick_ratio`, so the exact ratio is
+      only calculated for plugins whose bound reaches the threshold.
+    - The bigrams in each plugin's name are stored in an inverted index. A name can only be contained in a game's name
+      if all of its bigrams are, so substring checks are only done for those plugins.
+
+    Both filters are exact, so the results are the same as comparing every pair.
+    """
+
+    threshold = 0.9
+
+    def __init__(
+        self, plugins: Iterable[Any], key: Callable[[Any], str] = lambda p: p.game
+    ):
+        """
+        :param plugins: the plugins to match
+        :param key: function which gets the name of the game from a plugin
+        """
+        self.plugins: List[Any] = []
+        self._names: List[str] = []
+
+        for p in plugins:
+            # Plugins without a description have no game name, so they can't be matched.
+            if (name := key(p)) is not None:
+                self.plugins.append(p)
+                self._names.append(name)
+
+        self._lengths = [len(n) for n in self._names]
+        self._counts = [Counter(n) for n in self._names]
+
+        # Column for each character appearing in any plugin's name.
+        self._alphabet: Dict[str, int] = {}
+        for counts in self._counts:
+            for c in counts:
+                self._alphabet.setdefault(c, len(self._alphabet))
+
+        if numpy is not None:
+            self._matrix = numpy.zeros(
+                (len(self._names), len(self._alphabet)), dtype=numpy.int32
+            )
+            for row, counts in enumerate(self._counts):
+                for c, n in counts.items():
+                    self._matrix[row, self._alphabet[c]] = n
+
+            self._length_vector = numpy.array(self._lengths, dtype=numpy.int32)
+
+        # Inverted index from each bigram to the plugins whose (colon-free) names contain it.
+        self._stripped = [n.replace(":", "") for n in self._names]
+        self._bigrams: Dict[str, List[int]] = {}
+        self._bigram_counts: List[int] = []
+        # Names too short to have any bigrams, which are checked against every game.
+        self._short: List[int] = []
+
+        for i, name in enumerate(self._stripped):
+            bigrams = _bigrams(name)
+            self._bigram_counts.append(len(bigrams))
+
+            if not bigrams:
+                self._short.append(i)
+
+            for b in bigrams:
+                self._bigrams.setdefault(b, []).append(i)
+
+    def match(self, games: Iterable[str]) -> List[Any]:
+        """
+        Finds the plugins matching any of the games.
+
+        :param games: the names of the installed games
+        :return: the matching plugins, in the order they were given
+        """
+        matched: Set[int] = set()
+
+        for game in games:
+            if len(matched) == len(self.plugins):
+                break
+
+            matched.update(self._contained_in(game, matched))
+            matched.update(self._similar_to(game, matched))
+
+        return [p for i, p in enumerate(self.plugins) if i in matched]
+
+    def _contained_in(self, game: str, skip: Set[int]) -> List[int]:
+        stripped = game.replace(":", "")
+        hits: Dict[int, int] = {}
+
+        for b in _bigrams(stripped):
+            for i in self._bigrams.get(b, ()):
+                hits[i] = hits.get(i, 0) + 1
+
+        candidates = [i for i, n in hits.items() if n == self._bigram_counts[i]]
+        candidates += self._short
+
+        return [
+            i for i in candidates if i not in skip and self._stripped[i] in stripped
+        ]
+
+    def _similar_to(self, game: str, skip: Set[int]) -> List[int]:
+        out = []
+        matcher = SequenceMatcher(None, None, game)
+
+        for i in self._candidates(game):
+            if i in skip:
+                continue
+
+            matcher.set_seq1(self._names[i])
+            if matcher.ratio() >= self.threshold:
+                out.append(i)
+
+        return out
+
+    def _candidates(self, game: str) -> Iterable[int]:
+        """
+        Finds the plugins whose names share enough characters with the game's name to possibly reach the threshold.
+        """
+        counts = Counter(game)
+        length = len(game)
+
+        if numpy is not None:
+            vector = numpy.zeros(len(self._alphabet), dtype=numpy.int32)
+            for c, n in counts.items():
+                if (column := self._alphabet.get(c)) is not None:
+                    vector[column] = n
+
+            shared = numpy.minimum(self._matrix, vector).sum(axis=1)
+            bound = 2.0 * shared / numpy.maximum(self._length_vector + length, 1)
+
+            return numpy.flatnonzero(bound >= self.threshold).tolist()
+
+        out = []
+        for i, plugin_counts in enumerate(self._counts):
+            total = self._lengths[i] + length
+            # The ratio can't reach the threshold if the lengths are too different.
+            if (
+                not total
+                or 2.0 * min(self._lengths[i], length) / total < self.threshold
+            ):
+                continue
+
+            shared = sum((plugin_counts & counts).values())
+            if 2.0 * shared / total >= self.threshold:
+                out.append(i)
+
+        return out
+
+
+def _bigrams(text: str) -> Set[str]:
+    return {text[i : i + 2] for i in range(len(text) - 1)}
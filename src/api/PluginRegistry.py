@@ -0,0 +1,149 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import atexit
+import logging
+import os
+import threading
+from typing import Dict, Optional, Callable, List, Tuple
+
+from utils import serialization
+
+_registries: Dict[str, "PluginRegistry"] = {}
+_registries_lock = threading.Lock()
+
+
+def get_instance(path: str) -> "PluginRegistry":
+    """
+    Gets the registry for a "plugins.yaml" file. There is only one registry for each file, so every
+    PluginHandler sees the same data.
+
+    :param path: the path to the YAML file
+    """
+    with _registries_lock:
+        if path not in _registries:
+            _registries[path] = PluginRegistry(path)
+
+        return _registries[path]
+
+
+class PluginRegistry:
+    """
+    In-memory record of the installed plugins' URLs and the paths to their games, which is persisted
+    to "plugins.yaml".
+
+    Changes are written in batches shortly after they are made, rather than rewriting the file for every
+    change. If another process modifies the file, it is reloaded and any unsaved changes are reapplied.
+    """
+
+    # Seconds to wait for further changes before writing to disk.
+    flush_delay = 0.5
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self._data: Dict = None
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._pending: List[Callable[[Dict], None]] = []
+
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+
+        atexit.register(self.flush)
+
+    def urls(self) -> Dict[str, str]:
+        """
+        :return: dictionary whose keys are the URLs of the installed plugins, and whose values are the
+            names of the folders they are installed in
+        """
+        with self._lock:
+            return dict(self._get()["urls"])
+
+    def game_paths(self) -> Dict[str, str]:
+        """
+        :return: dictionary whose keys are plugin UIDs, and whose values are the paths to their games
+        """
+        with self._lock:
+            return dict(self._get()["gamePaths"])
+
+    def set_url(self, url: str, folder: str) -> None:
+        self._mutate(lambda data: data["urls"].__setitem__(url, folder))
+
+    def remove_url(self, url: str) -> None:
+        self._mutate(lambda data: data["urls"].pop(url, None))
+
+    def set_game_path(self, uid: str, path: str) -> None:
+        self._mutate(lambda data: data["gamePaths"].__setitem__(uid, path))
+
+    def flush(self) -> None:
+        """
+        Writes any unsaved changes to disk immediately.
+        """
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+            if not self._pending:
+                return
+
+            # Another process may have written to the file since it was loaded.
+            self._get()
+
+            serialization.dump(self._data, self.path)
+            self._stamp = _stamp(self.path)
+            self._pending.clear()
+
+    def _mutate(self, change: Callable[[Dict], None]) -> None:
+        with self._lock:
+            change(self._get())
+            self._pending.append(change)
+
+            if not self._timer:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _get(self) -> Dict:
+        """
+        :return: the current data, reloaded if the file was modified by another process
+        """
+        stamp = _stamp(self.path)
+
+        if self._data is None or stamp != self._stamp:
+            if self._data is not None:
+                logging.info(f"{self.path} was modified externally; reloading.")
+
+            data = serialization.load(self.path) if stamp else {}
+            data = data or {}
+            data["urls"] = data.get("urls") or {}
+            data["gamePaths"] = data.get("gamePaths") or {}
+
+            # Reapply the changes which haven't been saved yet.
+            for change in self._pending:
+                change(data)
+
+            self._data = data
+            self._stamp = stamp
+
+        return self._data
+
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        return None
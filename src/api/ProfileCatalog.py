@@ -0,0 +1,147 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from typing import List, Callable, Optional
+
+from api.ObjectStore import Tree
+from api.pipeline import walk
+from api.profiles import Profile, Feature
+
+
+class ProfileCatalog:
+    """
+    Persistent index of the profiles saved for a plugin.
+
+    Listing profiles from the catalog avoids reading every profile's YAML file. The catalog records the
+    modification time of the plugin's profile folder, so it is rebuilt from disk if profiles are added or
+    removed without going through the catalog.
+    """
+
+    def __init__(self, profile_dir: str):
+        self.profile_dir = profile_dir
+
+        # The database is kept outside the profile folder, since writing to it would change the folder's
+        # modification time.
+        self.path = f"{profile_dir}.db"
+
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                "uuid TEXT PRIMARY KEY, name TEXT, features TEXT, time REAL, size INTEGER)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)"
+            )
+
+    def list(self, load: Callable[[], List[Profile]]) -> List[Profile]:
+        """
+        Lists the profiles in the catalog, newest first.
+
+        :param load: function which loads the profiles from disk, used if the catalog needs to be rebuilt
+        :return: the profiles
+        """
+        if not self.is_consistent():
+            self.rebuild(load())
+
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT name, uuid, features, time FROM profiles ORDER BY time DESC"
+            ).fetchall()
+
+        return [_to_profile(*row) for row in rows]
+
+    def add(self, profile: Profile) -> None:
+        path = os.path.join(self.profile_dir, profile.uuid)
+
+        with closing(self._connect()) as db, db:
+            self._insert(db, profile, profile_size(path))
+            self._update_stamp_if_complete(db)
+
+    def remove(self, uuid: str) -> None:
+        with closing(self._connect()) as db, db:
+            db.execute("DELETE FROM profiles WHERE uuid = ?", (uuid,))
+            self._update_stamp_if_complete(db)
+
+    def rebuild(self, profiles: List[Profile]) -> None:
+        logging.info(f"Rebuilding profile catalog for {self.profile_dir}")
+
+        with closing(self._connect()) as db, db:
+            db.execute("DELETE FROM profiles")
+            for p in profiles:
+                self._insert(
+                    db, p, profile_size(os.path.join(self.profile_dir, p.uuid))
+                )
+
+            self._update_stamp(db)
+
+    def is_consistent(self) -> bool:
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT value FROM meta WHERE key = 'mtime'").fetchone()
+
+        return bool(row) and row[0] == self._stamp()
+
+    def _insert(self, db: sqlite3.Connection, profile: Profile, size: int) -> None:
+        features = ",".join(profile.feature.to_strings()) if profile.feature else None
+
+        db.execute(
+            "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?)",
+            (profile.uuid, profile.name, features, profile.time, size),
+        )
+
+    def _update_stamp(self, db: sqlite3.Connection) -> None:
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('mtime', ?)", (self._stamp(),))
+
+    def _update_stamp_if_complete(self, db: sqlite3.Connection) -> None:
+        """
+        Records the folder's modification time after a profile was added or removed, but only if the catalog lists
+        exactly the profiles in the folder. Otherwise the folder was also changed outside the catalog, and leaving
+        the old time makes the next listing rebuild the catalog.
+        """
+        with os.scandir(self.profile_dir) as it:
+            folders = {e.name for e in it if e.is_dir()}
+
+        listed = {row[0] for row in db.execute("SELECT uuid FROM profiles")}
+
+        if folders == listed:
+            self._update_stamp(db)
+
+    def _stamp(self) -> int:
+        return os.stat(self.profile_dir).st_mtime_ns
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+
+def _to_profile(name: str, uuid: str, features: Optional[str], time: float) -> Profile:
+    feature = Feature.from_strings(features.split(",")) if features else None
+    return Profile(name, uuid, feature, time)
+
+
+def profile_size(path: str) -> int:
+    """
+    :return: the total size of the files in a profile, in bytes
+    """
+    if tree := Tree.load(path):
+        return tree.size()
+
+    size = 0
+    for _, _, filenames in walk(path):
+        size += sum(f.stat().st_size for f in filenames)
+
+    return size
@@ -0,0 +1,136 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import logging
+import os
+import re
+from typing import Dict, List, Iterable
+
+from api.Keys import Keys
+from api.Platform import Platform
+from api.Plugin import Plugin
+
+
+class _Node:
+    __slots__ = ("children", "plugins")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # Indices of the plugins which have a verification path ending at this node.
+        self.plugins: List[int] = []
+
+
+class SignatureIndex:
+    """
+    Index of the verification paths of every installed plugin, used to find which plugin a game folder belongs to.
+
+    The paths are stored in a trie of path components, so checking a folder lists each folder along the way once
+    with `os.scandir`, and only enters subfolders which begin some plugin's verification path. The work done
+    depends on the number of entries read, rather than the number of plugins and paths.
+    """
+
+    def __init__(self, plugins: Iterable[Plugin]):
+        self.plugins: List[Plugin] = []
+        # The number of distinct verification paths each plugin has.
+        self._required: List[int] = []
+        self._root = _Node()
+
+        # Windows and macOS normally use case-insensitive file systems.
+        self._fold = Platform.get() is not Platform.LINUX
+
+        for plugin in plugins:
+            self.add(plugin)
+
+    def add(self, plugin: Plugin) -> None:
+        """
+        Adds a plugin to the index.
+
+        :param plugin: the plugin, which is ignored if it doesn't define any valid verification paths
+        """
+        paths = plugin.get(Keys.VERIFICATION_PATHS)
+        if not paths:
+            return
+
+        keys = set()
+        for p in paths:
+            parts = [
+                self._key(c) for c in re.split(r"[\\/]+", os.path.normpath(p)) if c
+            ]
+            if not parts or any(c in (".", "..") for c in parts):
+                logging.warning(
+                    f"Cannot index verification path {p!r} for {plugin.get_uid()}."
+                )
+                return
+
+            keys.add(tuple(parts))
+
+        index = len(self.plugins)
+        self.plugins.append(plugin)
+        self._required.append(len(keys))
+
+        for parts in keys:
+            node = self._root
+            for c in parts:
+                node = node.children.setdefault(c, _Node())
+
+            node.plugins.append(index)
+
+    def match(self, folder: str) -> List[Plugin]:
+        """
+        Finds the plugins whose verification paths all exist in a folder.
+
+        :param folder: the path to the folder, e.g. a game's installation folder
+        :return: the plugins matching the folder
+        """
+        found = [0] * len(self.plugins)
+        self._visit(folder, self._root, found)
+
+        return [p for i, p in enumerate(self.plugins) if found[i] == self._required[i]]
+
+    def match_all(self, folders: Iterable[str]) -> Dict[str, List[Plugin]]:
+        """
+        Finds the plugins matching each of several folders.
+
+        :param folders: the paths to the folders
+        :return: dictionary whose keys are the folders which matched at least one plugin, and whose values are
+            the plugins matching them
+        """
+        out = {}
+
+        for folder in folders:
+            if matches := self.match(folder):
+                out[folder] = matches
+
+        return out
+
+    def _visit(self, folder: str, node: _Node, found: List[int]) -> None:
+        try:
+            with os.scandir(folder) as it:
+                entries = [(self._key(e.name), e) for e in it]
+        except OSError:
+            return
+
+        for key, entry in entries:
+            if (child := node.children.get(key)) is None:
+                continue
+
+            for index in child.plugins:
+                found[index] += 1
+
+            if child.children and entry.is_dir():
+                self._visit(entry.path, child, found)
+
+    def _key(self, component: str) -> str:
+        return component.casefold() if self._fold else component
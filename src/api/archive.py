@@ -0,0 +1,189 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import hashlib
+import json
+import lzma
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, BinaryIO
+
+filename = "profile.archive"
+
+_magic = b"SWARCHV1"
+_footer = struct.Struct("<Q8s")
+_chunk_size = 1024 * 1024
+
+
+class ArchiveException(Exception):
+    pass
+
+
+def _compressor(codec: str, level: int):
+    if codec == "lzma":
+        return lzma.LZMACompressor(preset=level)
+    elif codec == "zlib":
+        return zlib.compressobj(level)
+
+    raise ArchiveException(f"Unknown compression codec: {codec=}.")
+
+
+def _decompressor(codec: str):
+    if codec == "lzma":
+        return lzma.LZMADecompressor()
+    elif codec == "zlib":
+        return zlib.decompressobj()
+
+    raise ArchiveException(f"Unknown compression codec: {codec=}.")
+
+
+class ArchiveWriter:
+    """
+    Writes files to a compressed, single-file profile archive.
+
+    Each member is compressed as a separate stream, and an index of the members is written at the end
+    of the archive. This allows any member to be extracted without decompressing the others.
+    """
+
+    def __init__(self, path: str, codec: str = "lzma", level: int = 6):
+        self.path = path
+        self.codec = codec
+        self.level = level
+
+        self._members: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(_magic)
+
+    def put(self, member: str, filepath: str) -> Dict:
+        """
+        Compresses a file into the archive.
+
+        :param member: the name to store the file under
+        :param filepath: the path to the file to add
+        :return: the entry describing the file, for use in a tree manifest
+        """
+        sha256 = hashlib.sha256()
+        stat = os.stat(filepath)
+
+        # Members are written one after another, so only one can be compressed at a time.
+        with self._lock, open(filepath, "rb") as f:
+            compressor = _compressor(self.codec, self.level)
+            offset = self._file.tell()
+            size = 0
+
+            for block in iter(lambda: f.read(_chunk_size), b""):
+                sha256.update(block)
+                size += len(block)
+                self._file.write(compressor.compress(block))
+
+            self._file.write(compressor.flush())
+
+            self._members[member] = {
+                "offset": offset,
+                "length": self._file.tell() - offset,
+                "size": size,
+            }
+
+        return {
+            "hash": sha256.hexdigest(),
+            "size": size,
+            "mtime": stat.st_mtime,
+            "member": member,
+        }
+
+    def close(self) -> None:
+        """
+        Writes the index and closes the archive.
+        """
+        index = json.dumps({"codec": self.codec, "members": self._members}).encode()
+        offset = self._file.tell()
+
+        self._file.write(index)
+        self._file.write(_footer.pack(offset, _magic))
+        self._file.close()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class ArchiveReader:
+    """
+    Reads individual members from a profile archive.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(path, "rb") as f:
+            f.seek(-_footer.size, os.SEEK_END)
+            end = f.tell()
+            offset, magic = _footer.unpack(f.read(_footer.size))
+
+            if magic != _magic:
+                raise ArchiveException(f"'{path}' is not a valid profile archive.")
+
+            f.seek(offset)
+            index = json.loads(f.read(end - offset))
+
+        self.codec: str = index["codec"]
+        self.members: Dict[str, Dict] = index["members"]
+
+    def extract(self, member: str, filepath: str) -> None:
+        """
+        Decompresses a single member of the archive.
+
+        :param member: the name of the member
+        :param filepath: the path to write the decompressed file to
+        """
+        info = self.members.get(member)
+        if info is None:
+            raise FileNotFoundError(f"Archive does not contain '{member}'.")
+
+        decompressor = _decompressor(self.codec)
+        remaining = info["length"]
+
+        with open(self.path, "rb") as src, open(filepath, "wb") as dst:
+            src.seek(info["offset"])
+
+            while remaining > 0:
+                block = src.read(min(_chunk_size, remaining))
+                if not block:
+                    raise ArchiveException(f"Archive '{self.path}' is truncated.")
+
+                remaining -= len(block)
+                dst.write(decompressor.decompress(block))
+
+            # Unlike LZMA, zlib may hold back some output until it is flushed.
+            if hasattr(decompressor, "flush"):
+                dst.write(decompressor.flush())
+
+    def digest(self, filepath: str) -> str:
+        from api.ObjectStore import _sha256
+
+        return _sha256(filepath)
+
+    def restore(self, entry: Dict, filepath: str) -> None:
+        """
+        Extracts a file described by an entry in a tree manifest. This mirrors `ObjectStore.restore`.
+        """
+        self.extract(entry["member"], filepath)
+        os.utime(filepath, (entry["mtime"], entry["mtime"]))
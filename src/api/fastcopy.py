@@ -0,0 +1,247 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import errno
+import logging
+import os
+import shutil
+import uuid
+from enum import Enum
+from os.path import join
+from typing import Dict, Tuple, List, Optional
+
+from api.Platform import Platform
+
+
+class Strategy(Enum):
+    """
+    The ways a file can be copied, from fastest to slowest.
+    """
+
+    REFLINK = "reflink"
+    COPY_FILE_RANGE = "copy_file_range"
+    SENDFILE = "sendfile"
+    USERSPACE = "userspace"
+
+
+# Size of the buffer used when data has to be copied through userspace.
+buffer_size = 1024 * 1024
+
+# The fastest strategy known to work for each pair of (source, destination) file systems.
+_strategies: Dict[Tuple[int, int], Strategy] = {}
+
+# Errors which mean a strategy isn't supported, rather than the copy failing.
+_unsupported = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.EINVAL,
+    errno.EBADF,
+    errno.EPERM,
+}
+
+# Linux ioctl request which clones a file's extents with copy-on-write, on file systems like Btrfs and XFS.
+_FICLONE = 0x40049409
+
+_linux = Platform.get() is Platform.LINUX
+
+
+class _ShortCopy(Exception):
+    """
+    Raised when a strategy stops before copying a whole range, e.g. because the file system doesn't support it
+    for a particular file, or because the source file was truncated while being copied.
+    """
+
+    pass
+
+
+def probe(folder: str) -> Optional[Strategy]:
+    """
+    Finds the fastest strategy supported when copying files within the file system containing a folder,
+    so it doesn't have to be discovered when the first real file is copied.
+
+    :param folder: a folder on the file system to probe
+    :return: the fastest supported strategy, or None if the platform doesn't use strategies
+    """
+    if not _linux:
+        return None
+
+    src = join(folder, f".{uuid.uuid4()}.probe")
+    dst = f"{src}.copy"
+
+    try:
+        with open(src, "wb") as f:
+            f.write(b"switcher")
+
+        copyfile(src, dst)
+    finally:
+        for f in (src, dst):
+            if os.path.exists(f):
+                os.remove(f)
+
+    dev = os.stat(folder).st_dev
+    strategy = _strategies.get((dev, dev))
+
+    logging.info(f"Copy strategy for {folder}: {strategy}")
+    return strategy
+
+
+def copyfile(src: str, dst: str) -> None:
+    """
+    Copies the contents of a file using the fastest strategy supported by the file systems involved.
+    Sparse regions of the source file remain sparse in the copy.
+
+    :param src: the path to the file to copy
+    :param dst: the path to copy the file to, which is overwritten if it exists
+    """
+    if not _linux:
+        shutil.copyfile(src, dst)
+        return
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        size = os.fstat(infd).st_size
+        key = (os.fstat(infd).st_dev, os.fstat(outfd).st_dev)
+
+        for strategy in _candidates(key):
+            try:
+                _copy(strategy, infd, outfd, size)
+            except _ShortCopy:
+                if strategy is Strategy.USERSPACE:
+                    raise OSError(
+                        errno.EIO, "File was truncated while being copied", src
+                    )
+
+                # The file is copied again with the next strategy rather than padded with zeros.
+                os.ftruncate(outfd, 0)
+                continue
+            except OSError as e:
+                if e.errno not in _unsupported or strategy is Strategy.USERSPACE:
+                    raise e
+
+                # Start again with the next strategy, in case this one wrote part of the file.
+                os.ftruncate(outfd, 0)
+                continue
+
+            _strategies[key] = strategy
+            return
+
+
+def copy2(src: str, dst: str) -> str:
+    """
+    Copies a file and its metadata. This can be used as the `copy_function` for `shutil.copytree`.
+    """
+    if os.path.isdir(dst):
+        dst = join(dst, os.path.basename(src))
+
+    copyfile(src, dst)
+    shutil.copystat(src, dst)
+
+    return dst
+
+
+def _candidates(key: Tuple[int, int]) -> List[Strategy]:
+    strategies = list(Strategy)
+
+    if known := _strategies.get(key):
+        return strategies[strategies.index(known) :]
+
+    return strategies
+
+
+def _copy(strategy: Strategy, infd: int, outfd: int, size: int) -> None:
+    if strategy is Strategy.REFLINK:
+        import fcntl
+
+        # Cloning shares the source's extents, so any holes are preserved automatically.
+        fcntl.ioctl(outfd, _FICLONE, infd)
+        return
+
+    for offset, length in _data_ranges(infd, size):
+        if strategy is Strategy.COPY_FILE_RANGE:
+            _copy_file_range(infd, outfd, offset, length)
+        elif strategy is Strategy.SENDFILE:
+            _sendfile(infd, outfd, offset, length)
+        else:
+            _userspace(infd, outfd, offset, length)
+
+    # Extending the file creates a hole if it ends with one.
+    os.ftruncate(outfd, size)
+
+
+def _data_ranges(fd: int, size: int) -> List[Tuple[int, int]]:
+    """
+    :return: the (offset, length) of each region in a file which contains data, skipping holes
+    """
+    try:
+        ranges = []
+        offset = 0
+
+        while offset < size:
+            try:
+                start = os.lseek(fd, offset, os.SEEK_DATA)
+            except OSError as e:
+                # No more data after the offset.
+                if e.errno == errno.ENXIO:
+                    break
+                raise e
+
+            end = os.lseek(fd, start, os.SEEK_HOLE)
+            ranges.append((start, end - start))
+            offset = end
+
+        return ranges
+    except (OSError, AttributeError):
+        # The file system doesn't support finding holes, so treat the file as all data.
+        return [(0, size)]
+
+
+def _copy_file_range(infd: int, outfd: int, offset: int, length: int) -> None:
+    end = offset + length
+
+    while offset < end:
+        copied = os.copy_file_range(infd, outfd, end - offset, offset, offset)
+        if not copied:
+            raise _ShortCopy()
+
+        offset += copied
+
+
+def _sendfile(infd: int, outfd: int, offset: int, length: int) -> None:
+    end = offset + length
+    os.lseek(outfd, offset, os.SEEK_SET)
+
+    while offset < end:
+        sent = os.sendfile(outfd, infd, offset, end - offset)
+        if not sent:
+            raise _ShortCopy()
+
+        offset += sent
+
+
+def _userspace(infd: int, outfd: int, offset: int, length: int) -> None:
+    end = offset + length
+
+    while offset < end:
+        buffer = os.pread(infd, min(buffer_size, end - offset), offset)
+        if not buffer:
+            raise _ShortCopy()
+
+        written = 0
+        while written < len(buffer):
+            written += os.pwrite(outfd, buffer[written:], offset + written)
+
+        offset += len(buffer)
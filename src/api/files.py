@@ -13,13 +13,20 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import glob
+import logging
 import os
+import re
 import shutil
+import threading
+import uuid
 from enum import Enum
 from os.path import join
-from typing import Union, List
+from typing import Union, List, Tuple, Callable, Dict, Optional, Set
 
-from api.PathEvaluator import PathEvaluator
+from api import fastcopy
+from api.PathEvaluator import PathEvaluator, ProtonEvaluator
+from api.pipeline import Pipeline, copytree, walk, workers_for
 from api.Platform import Platform
 
 _switcher_directory = None
@@ -69,6 +76,18 @@ def installer_path() -> str:
     return make_path(join(_settings.switcher_directory, "installers"))
 
 
+def objects_path() -> str:
+    return make_path(join(_settings.switcher_directory, "objects"))
+
+
+def headers_path() -> str:
+    return make_path(join(_settings.switcher_directory, "headers"))
+
+
+def thumbnails_path() -> str:
+    return make_path(join(_settings.switcher_directory, "thumbnails"))
+
+
 def log_path() -> str:
     return join(_switcher_directory, "switcher.log")
 
@@ -77,6 +96,14 @@ def settings_path() -> str:
     return join(_switcher_directory, "switcher.yaml")
 
 
+def discovery_path() -> str:
+    return join(_switcher_directory, "discovery.yaml")
+
+
+def catalog_path() -> str:
+    return join(_switcher_directory, "catalog.yaml")
+
+
 tag = "$!"  # Denotes part of a path as a variable.
 
 
@@ -97,15 +124,29 @@ class FilePathParsingException(Exception):
     pass
 
 
-def evaluate_path(path: Union[str, List[str]]) -> Union[Union[List[str], str]]:
+def evaluate_path(
+    path: Union[str, List[str]], proton_prefix: str = None
+) -> Union[Union[List[str], str]]:
     """
     Interprets a file path, translating special variables to create the real path for the current system.
 
     :param path: the file path to interpret
+    :param proton_prefix: the Wine prefix of the game, if it is a Windows game running through Proton
     :return: the real path for the current system
     """
     if isinstance(path, List):
-        return [evaluate_path(p) for p in path]
+        return [evaluate_path(p, proton_prefix) for p in path]
+
+    evaluator = _evaluator
+
+    if path and proton_prefix:
+        evaluator = ProtonEvaluator(proton_prefix)
+
+        # Windows drives are folders inside the prefix, e.g. "C:/" is "drive_c".
+        if drive := re.match(r"^([A-Za-z]):[/\\]", path):
+            path = join(
+                proton_prefix, f"drive_{drive[1].lower()}", path[3:].replace("\\", "/")
+            )
 
     if not path or tag not in path:
         return path
@@ -124,7 +165,7 @@ def evaluate_path(path: Union[str, List[str]]) -> Union[Union[List[str], str]]:
 
     for str_var in spl_closed:
         variable: PathVariable = PathVariable.get(str_var)
-        out = _evaluator.evaluate(variable)
+        out = evaluator.evaluate(variable)
 
         if not out:
             raise FilePathParsingException(
@@ -143,12 +184,13 @@ def sanitise_abs_path_for_profile(_path: str) -> str:
         return f"root{_path}"
 
 
-def _copyfiles(
-    from_path: str,
-    to_path: str,
-    item_paths: Union[List[str], str],
-    creating_profile: bool,
-) -> None:
+def _attempt(item_paths: Union[List[str], str], action: Callable[[str], None]) -> None:
+    """
+    Performs an action for each of the alternative paths to an item.
+
+    :param item_paths: the path, or list of alternative paths, to the item
+    :param action: the action to perform on each path
+    """
     if not isinstance(item_paths, List):
         item_paths = [
             item_paths,
@@ -161,7 +203,7 @@ def _copyfiles(
 
     for p in item_paths:
         try:
-            _copyfile(from_path, to_path, p, creating_profile)
+            action(p)
             success = True
         except Exception as e:
             exceptions.append(e)
@@ -171,9 +213,18 @@ def _copyfiles(
             raise e
 
 
-def _copyfile(
-    from_path: str, to_path: str, item_path: str, creating_profile: bool
+def _copyfiles(
+    from_path: str,
+    to_path: str,
+    item_paths: Union[List[str], str],
+    creating_profile: bool,
 ) -> None:
+    _attempt(item_paths, lambda p: _copyfile(from_path, to_path, p, creating_profile))
+
+
+def _resolve(
+    from_path: str, to_path: str, item_path: str, creating_profile: bool
+) -> Tuple[str, str]:
     # If the item_path is an absolute path, it's independent of the game folder and needs to be handled separately.
     if os.path.isabs(item_path):
         relative = sanitise_abs_path_for_profile(item_path)
@@ -192,6 +243,14 @@ def _copyfile(
         _from = join(from_path, item_path)
         _to = join(to_path, item_path)
 
+    return _from, _to
+
+
+def _copyfile(
+    from_path: str, to_path: str, item_path: str, creating_profile: bool
+) -> None:
+    _from, _to = _resolve(from_path, to_path, item_path, creating_profile)
+
     try:
         if not os.path.isdir(_to):
             folder, _ = os.path.split(_to)
@@ -206,8 +265,437 @@ def _copyfile(
         if os.path.exists(_to):
             shutil.rmtree(_to)
 
-        shutil.copytree(_from, _to)
+        copytree(_from, _to, copy_function=fastcopy.copy2)
     else:
-        shutil.copyfile(_from, _to)
+        fastcopy.copyfile(_from, _to)
 
     print(f"Copied '{_from}' to '{_to}'.")
+
+
+def _relative_item_path(item_path: str) -> str:
+    """
+    :return: the path under which an item is recorded in a profile's tree manifest
+    """
+    if os.path.isabs(item_path):
+        item_path = sanitise_abs_path_for_profile(item_path)
+
+    return item_path.replace(os.sep, "/")
+
+
+def _storefiles(
+    store: "ObjectStore",
+    tree: "Tree",
+    from_path: str,
+    item_paths: Union[List[str], str],
+    archive: "ArchiveWriter" = None,
+) -> None:
+    """
+    Adds the files for an item to the object store, recording them in a profile's tree manifest.
+
+    :param store: the object store to add the files to
+    :param tree: the tree manifest for the profile being created
+    :param from_path: the path to the game folder
+    :param item_paths: the path, or list of alternative paths, to the item
+    :param archive: if supplied, the files are compressed into this archive instead of the object store
+    """
+    _attempt(item_paths, lambda p: _storefile(store, tree, from_path, p, archive))
+
+
+def _storefile(
+    store: "ObjectStore",
+    tree: "Tree",
+    from_path: str,
+    item_path: str,
+    archive: "ArchiveWriter",
+) -> None:
+    _from, _ = _resolve(from_path, "", item_path, creating_profile=True)
+    relative = _relative_item_path(item_path)
+
+    def put(member: str, filepath: str) -> Dict:
+        if archive:
+            return archive.put(member, filepath)
+
+        return store.put(filepath)
+
+    if os.path.isdir(_from):
+        dirs, entries = [], {}
+
+        def put_entry(relative_file: str, filepath: str) -> None:
+            entries[relative_file] = put(f"{relative}/{relative_file}", filepath)
+
+        with Pipeline(workers_for(store.folder)) as pipeline:
+            for sub, dirnames, filenames in walk(_from):
+                prefix = f"{sub}/" if sub else ""
+
+                dirs.extend(f"{prefix}{d.name}" for d in dirnames)
+                for f in filenames:
+                    pipeline.submit(put_entry, f"{prefix}{f.name}", f.path)
+
+        item = {"type": "dir", "dirs": dirs, "files": entries}
+    else:
+        item = {"type": "file", "entry": put(relative, _from)}
+
+    if archive:
+        item["archived"] = True
+
+    tree.items[relative] = item
+    print(f"Stored '{_from}' as '{relative}'.")
+
+
+class SyncReport:
+    """
+    Summary of the work done when restoring files from a profile.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        self.files_copied = 0
+        self.bytes_copied = 0
+        self.files_skipped = 0
+        self.bytes_skipped = 0
+        self.files_deleted = 0
+
+    def copied(self, size: int) -> None:
+        with self._lock:
+            self.files_copied += 1
+            self.bytes_copied += size
+
+    def skipped(self, size: int) -> None:
+        with self._lock:
+            self.files_skipped += 1
+            self.bytes_skipped += size
+
+    def __str__(self) -> str:
+        return (
+            f"copied {self.files_copied} files ({self.bytes_copied} bytes), "
+            f"skipped {self.files_skipped} unchanged files ({self.bytes_skipped} bytes), "
+            f"deleted {self.files_deleted} files"
+        )
+
+
+def _restorefiles(
+    store: "ObjectStore",
+    tree: "Tree",
+    to_path: str,
+    item_paths: Union[List[str], str],
+    incremental: bool = True,
+    report: SyncReport = None,
+    swap: bool = False,
+) -> SyncReport:
+    """
+    Restores the files for an item from the object store, overwriting the current files.
+
+    :param store: the object store containing the files
+    :param tree: the tree manifest for the profile being applied
+    :param to_path: the path to the game folder
+    :param item_paths: the path, or list of alternative paths, to the item
+    :param incremental: whether to only copy the files which differ from the current files
+    :param report: the report to add to, if the results should be combined with another operation
+    :param swap: whether folders should be staged alongside the current folder and swapped into place
+    :return: a report describing the files which were copied, skipped and deleted
+    """
+    report = report or SyncReport()
+    _attempt(
+        item_paths,
+        lambda p: _restorefile(store, tree, to_path, p, incremental, report, swap),
+    )
+
+    return report
+
+
+def _restorefile(
+    store: "ObjectStore",
+    tree: "Tree",
+    to_path: str,
+    item_path: str,
+    incremental: bool,
+    report: SyncReport,
+    swap: bool,
+) -> None:
+    _, _to = _resolve("", to_path, item_path, creating_profile=False)
+    relative = _relative_item_path(item_path)
+
+    item = tree.items.get(relative)
+    if not item:
+        raise FileNotFoundError(f"Profile does not contain '{relative}'.")
+
+    # Files are restored from the profile's archive if they were compressed when it was saved.
+    source = tree.source(item, store)
+
+    if item["type"] == "dir" and swap:
+        _swap_dir(source, item, _to, incremental, report)
+    elif item["type"] == "dir":
+        if os.path.exists(_to) and not incremental:
+            shutil.rmtree(_to)
+
+        _sync_dir(source, item, _to, report)
+    else:
+        folder, _ = os.path.split(_to)
+        os.makedirs(folder, exist_ok=True)
+
+        stat = _stat(_to) if incremental else None
+        _sync_file(source, item["entry"], _to, stat, report)
+
+    print(f"Restored '{relative}' to '{_to}'.")
+
+
+# Suffixes for the folders kept alongside a folder which is swapped into place when applying a profile.
+_staged_suffix = ".switcher-staged"
+_previous_suffix = ".switcher-previous"
+_discarded_suffix = ".switcher-discarded"
+
+
+def _swap_dir(
+    source: Union["ObjectStore", "ArchiveReader"],
+    item: Dict,
+    to_path: str,
+    incremental: bool,
+    report: SyncReport,
+) -> None:
+    """
+    Applies a directory item by preparing it in a staging folder next to the current folder, then switching
+    the folders with renames. The current folder is untouched until the switch, so a crash while copying
+    can't leave the game with a half-applied profile, and the switch takes the same time for any size of folder.
+
+    The staging folder starts as hard links to the current files, so only the files which differ from the
+    profile are copied. The replaced folder is kept until the next switch, so the switch can be undone with
+    `_rollback_dir`. Files which the profile didn't change are shared with the replaced folder, so changes the
+    game makes to them in place are kept by a rollback.
+    """
+    staged = f"{to_path}{_staged_suffix}"
+    previous = f"{to_path}{_previous_suffix}"
+
+    _recover_dir(to_path)
+
+    # A staging folder left over from an interrupted apply may be out of date, and linking is cheap.
+    if os.path.exists(staged):
+        _discard(staged)
+
+    if incremental and os.path.isdir(to_path):
+        shutil.copytree(to_path, staged, symlinks=True, copy_function=_link_or_copy)
+
+    _sync_dir(source, item, staged, report)
+
+    # The folder replaced by the last switch is moved aside, and only deleted once this switch has succeeded.
+    discarded = _set_aside(previous)
+
+    try:
+        if os.path.exists(to_path):
+            os.rename(to_path, previous)
+    except OSError as e:
+        # The folder can't be moved, e.g. because the game is running on Windows. Update it in place instead.
+        logging.warning(f"Could not swap '{to_path}', updating it in place: {e}")
+        if discarded:
+            os.rename(discarded, previous)
+
+        _discard(staged)
+        return _sync_dir(source, item, to_path, report)
+
+    try:
+        os.rename(staged, to_path)
+    except OSError as e:
+        # Put the folders back, so the game isn't left without its folder and the last switch can still be undone.
+        if os.path.exists(previous) and not os.path.exists(to_path):
+            os.rename(previous, to_path)
+            if discarded:
+                os.rename(discarded, previous)
+        raise e
+
+    if discarded:
+        _discard(discarded)
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        # The file system doesn't support hard links, e.g. FAT32.
+        fastcopy.copy2(src, dst)
+
+
+def _set_aside(folder: str) -> Optional[str]:
+    """
+    Renames a folder to a unique name, so its name can be reused before the folder has been deleted.
+
+    :return: the folder's new path, or None if it doesn't exist
+    """
+    if not os.path.exists(folder):
+        return None
+
+    aside = f"{folder}.{uuid.uuid4().hex[:8]}{_discarded_suffix}"
+    os.rename(folder, aside)
+    return aside
+
+
+def _discard(folder: str) -> None:
+    """
+    Deletes a folder in a background thread, so applying a profile doesn't wait for it. Folders which weren't
+    deleted completely, e.g. because the application closed first, are deleted the next time a folder is discarded.
+    """
+    parent = os.path.dirname(folder)
+    leftovers = glob.glob(join(glob.escape(parent), f"*{_discarded_suffix}"))
+
+    aside = folder if folder.endswith(_discarded_suffix) else _set_aside(folder)
+    targets = list(dict.fromkeys([aside, *leftovers]))
+
+    def delete() -> None:
+        for f in targets:
+            # A leftover may already be being deleted by an earlier thread.
+            if os.path.exists(f):
+                shutil.rmtree(f, onerror=log_rmtree_error)
+
+    threading.Thread(target=delete, name="discard", daemon=True).start()
+
+
+def log_rmtree_error(function, path: str, exc_info) -> None:
+    """
+    Logs the files which `shutil.rmtree` could not delete, when used as its `onerror` handler.
+    """
+    if isinstance(exc_info[1], FileNotFoundError):
+        return
+
+    logging.warning(f"Could not delete '{path}': {exc_info[1]}")
+
+
+def _rollback_dir(to_path: str) -> bool:
+    """
+    Undoes the last switch made by `_swap_dir`, restoring the folder which was replaced.
+
+    :param to_path: the path to the folder
+    :return: whether there was a previous folder to restore
+    """
+    previous = f"{to_path}{_previous_suffix}"
+    if not os.path.isdir(previous):
+        return False
+
+    current = _set_aside(to_path)
+
+    try:
+        os.rename(previous, to_path)
+    except OSError as e:
+        if current:
+            os.rename(current, to_path)
+        raise e
+
+    if current:
+        _discard(current)
+
+    return True
+
+
+def _recover_dir(to_path: str) -> None:
+    """
+    Puts a folder back if the application stopped between the two renames of a switch.
+    """
+    previous = f"{to_path}{_previous_suffix}"
+
+    if not os.path.exists(to_path) and os.path.isdir(previous):
+        logging.warning(f"Recovering '{to_path}' after an interrupted switch.")
+        os.rename(previous, to_path)
+
+
+def _sync_dir(
+    source: Union["ObjectStore", "ArchiveReader"],
+    item: Dict,
+    to_path: str,
+    report: SyncReport,
+):
+    """
+    Makes the contents of a folder match a directory item from a tree manifest, copying only the
+    files which were added or changed and deleting the files which were removed.
+    """
+    if os.path.isfile(to_path):
+        os.remove(to_path)
+
+    live_dirs, live_files = _scan(to_path)
+    wanted_dirs = set(item["dirs"])
+    wanted_files = item["files"]
+
+    # Remove anything which isn't in the profile, deepest paths first.
+    for f in live_files.keys() - wanted_files.keys():
+        os.remove(join(to_path, *f.split("/")))
+        report.files_deleted += 1
+
+    for d in sorted(live_dirs - wanted_dirs, reverse=True):
+        path = join(to_path, *d.split("/"))
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+    os.makedirs(to_path, exist_ok=True)
+    for d in sorted(wanted_dirs - live_dirs):
+        path = join(to_path, *d.split("/"))
+        if os.path.isfile(path):
+            os.remove(path)
+
+        os.makedirs(path, exist_ok=True)
+
+    with Pipeline(workers_for(to_path)) as pipeline:
+        for f, entry in wanted_files.items():
+            filepath = join(to_path, *f.split("/"))
+            pipeline.submit(
+                _sync_file, source, entry, filepath, live_files.get(f), report
+            )
+
+
+def _sync_file(
+    source: Union["ObjectStore", "ArchiveReader"],
+    entry: Dict,
+    filepath: str,
+    stat: Optional[os.stat_result],
+    report: SyncReport,
+) -> None:
+    if stat and stat.st_size == entry["size"]:
+        # Files restored from a profile are given the modification time they were saved with, so
+        # a matching size and modification time means the file hasn't been touched since.
+        if abs(stat.st_mtime - entry["mtime"]) < _mtime_tolerance:
+            return report.skipped(entry["size"])
+
+        # Otherwise, including near matches on file systems which round modification times, e.g. FAT32 to
+        # 2 seconds, compare the contents. This is slower but still avoids writing the file.
+        if source.digest(filepath) == entry["hash"]:
+            os.utime(filepath, (entry["mtime"], entry["mtime"]))
+            return report.skipped(entry["size"])
+
+    if stat and os.path.isdir(filepath):
+        shutil.rmtree(filepath)
+    elif stat and stat.st_nlink > 1:
+        # The file is a hard link into another folder, e.g. while staging a swap, so it must not be written through.
+        os.remove(filepath)
+
+    source.restore(entry, filepath)
+    report.copied(entry["size"])
+
+
+# Only allows for the rounding of the modification time when it is stored as a float. A file rewritten shortly
+# after the profile was saved has a close but different time, so that isn't treated as unchanged.
+_mtime_tolerance = 1e-6
+
+
+def _stat(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def _scan(folder: str) -> Tuple[Set[str], Dict[str, os.stat_result]]:
+    """
+    Lists the contents of a folder recursively.
+
+    :param folder: the folder to scan
+    :return: the relative paths to all subfolders, and a dictionary mapping the relative path of each file to its stat
+    """
+    dirs, filestats = set(), {}
+
+    if not os.path.isdir(folder):
+        return dirs, filestats
+
+    for sub, dirnames, filenames in walk(folder):
+        prefix = f"{sub}/" if sub else ""
+
+        dirs.update(f"{prefix}{d.name}" for d in dirnames)
+        for f in filenames:
+            filestats[f"{prefix}{f.name}"] = f.stat()
+
+    return dirs, filestats
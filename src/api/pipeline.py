@@ -0,0 +1,176 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from os.path import join
+from typing import Callable, List, Iterator, Tuple
+
+from api import fastcopy
+from api.Platform import Platform
+
+
+def workers_for(path: str) -> int:
+    """
+    Chooses how many files to copy concurrently when writing to a location.
+
+    Solid-state drives need many requests in flight to be kept busy, while hard drives slow down
+    when they have to seek between files.
+
+    :param path: the path being written to
+    :return: the number of worker threads to use
+    """
+    from utils import settings
+
+    if configured := settings.get_instance().copy_workers:
+        return configured
+
+    if _is_rotational(path):
+        return 2
+
+    return min(32, (os.cpu_count() or 4) * 4)
+
+
+def _is_rotational(path: str) -> bool:
+    if Platform.get() is not Platform.LINUX:
+        return False
+
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            return False
+        path = parent
+
+    dev = os.stat(path).st_dev
+    block = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+
+    # Partitions don't have a queue of their own, so check the disk containing them.
+    for queue in (join(block, "queue"), join(block, "..", "queue")):
+        try:
+            with open(join(queue, "rotational"), "r") as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+
+    return False
+
+
+class Pipeline:
+    """
+    Bounded pool of threads which performs file operations concurrently.
+
+    Tasks are submitted while the files are still being enumerated, so copying starts straight away.
+    Errors are collected instead of stopping the other tasks, and raised when the pipeline finishes.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self.errors: List[Exception] = []
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        # Limit the tasks waiting in the queue, so enumerating a huge folder doesn't use lots of memory.
+        self._slots = threading.BoundedSemaphore(self.workers * 4)
+        self._lock = threading.Lock()
+
+    def submit(self, target: Callable, *args) -> None:
+        self._slots.acquire()
+
+        future: Future = self._executor.submit(target, *args)
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future: Future) -> None:
+        self._slots.release()
+
+        if e := future.exception():
+            with self._lock:
+                self.errors.append(e)
+
+    def join(self) -> None:
+        """
+        Waits for all the tasks to finish, then raises the first error if any of them failed.
+        """
+        self._executor.shutdown(wait=True)
+
+        if self.errors:
+            for e in self.errors[1:]:
+                logging.error(e)
+
+            raise self.errors[0]
+
+    def __enter__(self) -> "Pipeline":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type:
+            self._executor.shutdown(wait=True)
+        else:
+            self.join()
+
+
+def walk(folder: str) -> Iterator[Tuple[str, List[os.DirEntry], List[os.DirEntry]]]:
+    """
+    Lists the contents of a folder recursively using `os.scandir`, parents before their children.
+
+    :param folder: the folder to list
+    :return: a generator which yields the relative path to each folder ("" for the top folder),
+        with its subfolders and files
+    """
+    pending = [("", folder)]
+
+    while pending:
+        relative, path = pending.pop()
+        dirs, filenames = [], []
+
+        with os.scandir(path) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    dirs.append(e)
+                else:
+                    filenames.append(e)
+
+        yield relative, dirs, filenames
+
+        prefix = f"{relative}/" if relative else ""
+        pending.extend((f"{prefix}{d.name}", d.path) for d in dirs)
+
+
+def copytree(src: str, dst: str, copy_function: Callable = fastcopy.copy2) -> None:
+    """
+    Copies a folder recursively, like `shutil.copytree`, with the files copied concurrently.
+
+    :param src: the folder to copy
+    :param dst: the path to copy the folder to, which must not exist
+    :param copy_function: the function used to copy each file
+    """
+    folders = []
+
+    with Pipeline(workers_for(dst)) as pipeline:
+        for relative, _, filenames in walk(src):
+            _from = join(src, *relative.split("/")) if relative else src
+            _to = join(dst, *relative.split("/")) if relative else dst
+
+            # Folders are created before the files inside them are queued.
+            os.makedirs(_to, exist_ok=bool(relative))
+            folders.append((_from, _to))
+
+            for f in filenames:
+                pipeline.submit(copy_function, f.path, join(_to, f.name))
+
+    # Copy the folders' metadata last, since copying the files changes their modification times.
+    for _from, _to in folders:
+        shutil.copystat(_from, _to)
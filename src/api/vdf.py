@@ -0,0 +1,87 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import re
+from typing import Dict, Iterator, Tuple
+
+# Matches quoted strings (with escaped characters), unquoted words and braces. Comments are skipped.
+_token = re.compile(r'"((?:[^"\\]|\\.)*)"|(//[^\n]*)|([{}])|([^\s{}"]+)')
+_escapes = {"n": "\n", "t": "\t", "\\": "\\", '"': '"'}
+
+
+class VDFParsingException(Exception):
+    pass
+
+
+def loads(text: str) -> Dict:
+    """
+    Parses text in Valve's KeyValues format, as used by Steam's ".vdf" and ".acf" files.
+
+    Keys are case-insensitive in KeyValues, so they are converted to lowercase.
+
+    :param text: the text to parse
+    :return: dictionary containing the parsed keys and values, with nested dictionaries for sections
+    """
+    tokens = _tokenise(text)
+    return _parse(tokens, nested=False)
+
+
+def load(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return loads(f.read())
+
+
+def _tokenise(text: str) -> Iterator[Tuple[str, str]]:
+    for m in _token.finditer(text):
+        quoted, comment, brace, word = m.groups()
+
+        if comment:
+            continue
+        elif brace:
+            yield "brace", brace
+        elif quoted is not None:
+            yield "string", re.sub(
+                r"\\(.)", lambda e: _escapes.get(e.group(1), e.group(1)), quoted
+            )
+        else:
+            yield "string", word
+
+
+def _parse(tokens: Iterator[Tuple[str, str]], nested: bool) -> Dict:
+    out = {}
+
+    for kind, value in tokens:
+        if kind == "brace":
+            if value == "}" and nested:
+                return out
+
+            raise VDFParsingException(f"Unexpected '{value}'.")
+
+        key = value.lower()
+        kind, value = next(tokens, (None, None))
+
+        if kind is None:
+            raise VDFParsingException(f"Missing value for key '{key}'.")
+        elif kind == "brace" and value == "{":
+            out[key] = _parse(tokens, nested=True)
+        elif kind == "string":
+            out[key] = value
+        else:
+            raise VDFParsingException(f"Unexpected '{value}' after key '{key}'.")
+
+    if nested:
+        raise VDFParsingException("Missing closing brace.")
+
+    return out
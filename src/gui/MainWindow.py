@@ -16,7 +16,7 @@
 import asyncio
 import logging
 import webbrowser
-from typing import List, Optional
+from typing import List, Optional, Dict
 
 from PyQt5 import uic
 from PyQt5.QtWidgets import (
@@ -27,10 +27,11 @@ from PyQt5.QtWidgets import (
     QListWidgetItem,
     QLabel,
     QMessageBox,
+    QPushButton,
 )
 from github.GitRelease import GitRelease
 
-from api import GameFinder
+from api import GameFinder, GameWatcher, HeaderFetcher
 from api.Launcher import Launcher
 from api.Plugin import Plugin
 from api.PluginHandler import PluginHandler
@@ -46,7 +47,7 @@ from gui.widgets.PluginWidget import PluginWidget
 from gui.widgets.ProfileWidget import ProfileWidget
 from updates.UpdateHandler import UpdateHandler
 from updates.UpdateStatus import UpdateStatus
-from utils import resources, settings, errorhandling, args
+from utils import resources, settings, errorhandling, args, serialization
 
 
 class MainWindow(MainGUI, QMainWindow):
@@ -67,6 +68,7 @@ class MainWindow(MainGUI, QMainWindow):
         self.plugin_handler: PluginHandler = application.plugin_handler
 
         self.game_finder = GameFinder.get()
+        self.game_watcher: Optional[GameWatcher.GameWatcher] = None
 
         self.update_handler: UpdateHandler = UpdateHandler()
         self.update_status = UpdateStatus.UNKNOWN
@@ -78,6 +80,7 @@ class MainWindow(MainGUI, QMainWindow):
         asyncio.ensure_future(self.coro_find_games())
 
     def setup_ui(self) -> None:
+
         uic.loadUi(resources.get_layout(), self)
 
         self.progress_save_profile.hide()
@@ -97,6 +100,12 @@ class MainWindow(MainGUI, QMainWindow):
         self.lbl_update.setMargin(8)
         self.statusBar().addPermanentWidget(self.lbl_update)
 
+        # Shown after a profile is applied, until another plugin is selected.
+        self.btn_undo_apply = QPushButton("Undo apply")
+        self.btn_undo_apply.clicked.connect(self.undo_apply)
+        self.btn_undo_apply.hide()
+        self.statusBar().addPermanentWidget(self.btn_undo_apply)
+
         self.refresh_update_lbl()
 
         plugins = self.plugin_handler.plugins
@@ -158,7 +167,14 @@ class MainWindow(MainGUI, QMainWindow):
         asyncio.ensure_future(self.coro_find_games(force=True))
 
     async def coro_find_games(self, force=False):
-        games = await self.game_finder.coro_find_games()
+        games = {}
+
+        async for location, name in self.game_finder.stream_games(force):
+            games[location] = name
+            self.statusBar().showMessage(f"Discovering games: found {name}")
+
+        self.statusBar().clearMessage()
+        await self.coro_assign_game_paths(games)
 
         cache = self.prefs.games
         unique = [loc for loc, _ in games.items() if loc not in cache]
@@ -185,6 +201,61 @@ class MainWindow(MainGUI, QMainWindow):
         else:
             print(f"No unique games found.")
 
+        self.start_game_watcher(games)
+
+    def start_game_watcher(self, games: Dict[str, str]) -> None:
+        if self.game_watcher:
+            # Games found by a full rescan shouldn't be reported again by the watcher.
+            self.game_watcher.games = dict(games)
+            return
+
+        if not self.prefs.watch_games or not GameWatcher.is_supported():
+            return
+
+        loop = asyncio.get_event_loop()
+
+        def on_games_changed(added: Dict[str, str], removed: List[str]) -> None:
+            # Called from the watcher's thread, so hand over to the GUI thread.
+            loop.call_soon_threadsafe(
+                lambda: asyncio.ensure_future(self.coro_games_changed(added, removed))
+            )
+
+        try:
+            self.game_watcher = GameWatcher.GameWatcher(
+                self.game_finder, on_games_changed
+            )
+            self.game_watcher.start(games)
+        except OSError as e:
+            logging.warning(f"Could not watch for new games: {e}")
+            self.game_watcher = None
+
+    async def coro_assign_game_paths(self, games: Dict[str, str]) -> None:
+        self.plugin_handler.set_proton_prefixes(self.game_finder.proton_prefixes)
+
+        # Checking the folders reads from the disk, so keep it off the GUI thread.
+        assigned = await asyncio.get_event_loop().run_in_executor(
+            None, self.plugin_handler.assign_game_paths, list(games)
+        )
+
+        if (active := self.get_active_plugin_widget()) and active.plugin in assigned:
+            self.lbl_game_loc.setText(active.plugin.game_path)
+
+    async def coro_games_changed(
+        self, added: Dict[str, str], removed: List[str]
+    ) -> None:
+        self.prefs.games = [g for g in self.prefs.games if g not in removed] + [
+            g for g in added if g not in self.prefs.games
+        ]
+        self.prefs.commit()
+
+        await self.coro_assign_game_paths(added)
+
+        # Only the new games need to be matched against plugins.
+        if added and (to_install := await self.plugin_handler.suggest_plugins(added)):
+            InstallPluginsDialog(
+                self.application, self.plugin_handler, to_install
+            ).exec()
+
     def refresh_update_lbl(self, version=None):
         if version:
             text = f"Click to update to {version}"
@@ -213,7 +284,14 @@ class MainWindow(MainGUI, QMainWindow):
         )
 
         if dialog.exec() == QDialog.Accepted and (changes := dialog.get_changes()):
-            self.plugin_handler.apply_changes(changes)
+            if failed := self.plugin_handler.apply_changes(changes):
+                names = "\n".join(url.split("/")[-1] for url in failed)
+                msg = QMessageBox()
+                msg.setIcon(QMessageBox.Warning)
+                msg.setText(f"The following plugins could not be changed:\n\n{names}")
+                msg.setWindowTitle("Manage plugins")
+                msg.exec()
+
             self.application.restart()
 
     def on_plugin_activation_changed(self, plugin: Plugin) -> None:
@@ -221,6 +299,8 @@ class MainWindow(MainGUI, QMainWindow):
             if p.plugin is not plugin and p.active:
                 p.toggle_activation(trigger=False)
 
+        self.btn_undo_apply.hide()
+
         loc = plugin.game_path or "Game location unknown"
         self.lbl_game_loc.setText(loc)
 
@@ -264,6 +344,20 @@ class MainWindow(MainGUI, QMainWindow):
         plugin = self.get_active_plugin()
 
         self.plugin_handler.apply_profile(plugin, profile)
+        self.btn_undo_apply.show()
+
+    def undo_apply(self) -> None:
+        plugin = self.get_active_plugin()
+        self.btn_undo_apply.hide()
+
+        if not self.plugin_handler.rollback_profile(plugin):
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Information)
+            msg.setText(
+                "The last profile can't be undone, because it replaced the game's files in place."
+            )
+            msg.setWindowTitle("Undo apply")
+            msg.exec()
 
     def delete_profile(self, profile: Profile) -> None:
         plugin = self.get_active_plugin()
@@ -275,9 +369,8 @@ class MainWindow(MainGUI, QMainWindow):
         list_widget: QListWidget = self.listwidget_profiles
         list_widget.clear()
 
-        if profiles := sorted(
-            self.plugin_handler.get_profiles(plugin), key=lambda i: i.time, reverse=True
-        ):
+        # Profiles are already sorted, newest first.
+        if profiles := self.plugin_handler.get_profiles(plugin):
             for p in profiles:
                 w = ProfileWidget(p, plugin, self.plugin_handler, self)
 
@@ -384,3 +477,10 @@ class MainWindow(MainGUI, QMainWindow):
 
     def closeEvent(self, *args, **kwargs) -> None:
         errorhandling.remove_hook(self.except_hook)
+
+        if self.game_watcher:
+            self.game_watcher.stop()
+
+        asyncio.ensure_future(HeaderFetcher.get_instance().close())
+
+        logging.info(f"YAML cache: {serialization.stats}")
@@ -0,0 +1,168 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from os import path
+from typing import Dict, Tuple
+
+from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtGui import QImage, QPixmap
+
+from api import files
+
+_cache: "ThumbnailCache" = None
+
+
+def get_instance() -> "ThumbnailCache":
+    global _cache
+
+    if not _cache:
+        _cache = ThumbnailCache()
+
+    return _cache
+
+
+class ThumbnailCache:
+    """
+    Caches header images which have been scaled to the size of a PluginWidget.
+
+    Scaled pixmaps are kept in memory, evicting the least recently used ones beyond `max_bytes`, and saved to disk so
+    they don't need to be scaled again when Switcher next starts. Thumbnails are keyed by plugin, a hash of the header
+    image and the target size, so a changed header is never shown at a stale size. Images are decoded and scaled in a
+    worker thread; only converting the result to a QPixmap happens on the GUI thread.
+    """
+
+    max_bytes = 64 * 1024 * 1024  # Memory used by pixmaps.
+    sizes_per_header = 4  # Thumbnails kept on disk for each header.
+
+    def __init__(self, folder: str = None):
+        """
+        :param folder: the folder to save thumbnails in
+        """
+        self.folder = folder or files.thumbnails_path()
+
+        self._pixmaps: "OrderedDict[Tuple[str, str, int, int], QPixmap]" = OrderedDict()
+        self._bytes = 0
+
+        # Hashes of header images, with the modification time they were calculated for.
+        self._digests: Dict[str, Tuple[int, str]] = {}
+
+    async def get(self, plugin: str, header: str, size: QSize) -> QPixmap:
+        """
+        Gets a header image scaled to a particular size.
+
+        :param plugin: the UID of the plugin which the header belongs to
+        :param header: the path to the header image
+        :param size: the size to scale the image to
+        :return: the scaled image
+        """
+        loop = asyncio.get_event_loop()
+        width, height = size.width(), size.height()
+
+        mtime = os.stat(header).st_mtime_ns
+        cached = self._digests.get(header)
+
+        if cached and cached[0] == mtime:
+            digest = cached[1]
+        else:
+            digest = await loop.run_in_executor(None, _hash_file, header)
+            self._digests[header] = (mtime, digest)
+
+        key = (plugin, digest, width, height)
+
+        if (pixmap := self._pixmaps.get(key)) is not None:
+            self._pixmaps.move_to_end(key)
+            return pixmap
+
+        image = await loop.run_in_executor(
+            None, self._load, plugin, header, digest, width, height
+        )
+        pixmap = QPixmap.fromImage(image)
+        self._put(key, pixmap)
+
+        return pixmap
+
+    def _put(self, key: Tuple[str, str, int, int], pixmap: QPixmap) -> None:
+        if key in self._pixmaps:
+            return
+
+        self._pixmaps[key] = pixmap
+        self._bytes += _pixmap_bytes(pixmap)
+
+        while self._bytes > self.max_bytes and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self._bytes -= _pixmap_bytes(evicted)
+
+    def _load(
+        self, plugin: str, header: str, digest: str, width: int, height: int
+    ) -> QImage:
+        """
+        Loads a thumbnail from disk, or scales the header image and saves the result. Runs in a worker thread.
+        """
+        plugin_folder = path.join(self.folder, plugin)
+        thumbnail = path.join(plugin_folder, f"{digest}-{width}x{height}.png")
+
+        image = QImage(thumbnail)
+        if not image.isNull():
+            # Keeps recently used thumbnails from being pruned.
+            os.utime(thumbnail)
+            return image
+
+        image = QImage(header).scaled(
+            width, height, transformMode=Qt.SmoothTransformation
+        )
+
+        os.makedirs(plugin_folder, exist_ok=True)
+        temp = f"{thumbnail}.tmp"
+        if image.save(temp, "PNG"):
+            os.replace(temp, thumbnail)
+            self._prune(plugin_folder, digest)
+
+        return image
+
+    def _prune(self, plugin_folder: str, digest: str) -> None:
+        """
+        Deletes thumbnails of previous header images, and all but the most recently used sizes of the current one.
+        """
+        current, stale = [], []
+
+        with os.scandir(plugin_folder) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp"):
+                    continue
+                elif entry.name.startswith(f"{digest}-"):
+                    current.append(entry)
+                else:
+                    stale.append(entry)
+
+        current.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+
+        for entry in stale + current[self.sizes_per_header :]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def _hash_file(filepath: str) -> str:
+    with open(filepath, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _pixmap_bytes(pixmap: QPixmap) -> int:
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
@@ -55,17 +55,16 @@ class CreatePluginDialog(QDialog):
         asyncio.ensure_future(self.coro_update_listwidget())
 
     async def coro_update_listwidget(self):
-        self.games = await self.game_finder.coro_find_games()
-
-        for location, name in self.games.items():
+        # Show each game as soon as it's found, rather than waiting for every library to be scanned.
+        async for location, name in self.game_finder.stream_games():
+            self.games[location] = name
             self.list_games.addItem(name)
 
     def on_next_clicked(self) -> None:
         game = self.list_games.selectedItems()[0].text()
         path = [k for k, v in self.games.items() if v == game][0]
 
-        json = magic_link.get_json(game, path)
-        asyncio.ensure_future(self.push_data(json))
+        asyncio.ensure_future(self.push_data(game, path))
 
         self.list_games.hide()
         self.lbl_instructions.hide()
@@ -75,7 +74,11 @@ class CreatePluginDialog(QDialog):
         self.progress_connecting.setVisible(True)
         self.lbl_connecting.setVisible(True)
 
-    async def push_data(self, json: str) -> None:
+    async def push_data(self, game: str, path: str) -> None:
+        # Finding the executable reads the game folder, so keep it off the GUI thread.
+        json = await asyncio.get_event_loop().run_in_executor(
+            None, magic_link.get_json, game, path
+        )
         await magic_link.post_data(self.code, json)
 
         self.progress_connecting.hide()
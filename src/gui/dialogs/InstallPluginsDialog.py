@@ -13,6 +13,7 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
 from typing import List
 
 from PyQt5 import uic
@@ -21,6 +22,7 @@ from PyQt5.QtGui import QCloseEvent
 from PyQt5.QtWidgets import QDialog, QProgressBar, QLabel, QPushButton
 
 from api.PluginHandler import PluginHandler
+from api.PluginInstaller import PluginInstaller
 from utils import resources
 
 
@@ -55,9 +57,15 @@ class InstallPluginsDialog(QDialog):
 
     def on_progress(self, done, total, url: str):
         if done >= total:
-            self.lbl_status.setText(
-                "Finished installing plugins. Restart Switcher to continue."
-            )
+            if failed := self.install_thread.failed:
+                names = ", ".join(url.split("/")[-1] for url in failed)
+                self.lbl_status.setText(
+                    f"Could not install: {names}. Restart Switcher to continue."
+                )
+            else:
+                self.lbl_status.setText(
+                    "Finished installing plugins. Restart Switcher to continue."
+                )
             self.btn_cancel.hide()
 
             self.finished = True
@@ -89,9 +97,10 @@ class InstallThread(QThread):
         self.plugin_handler = plugin_handler
         self.to_install = to_install
 
-    def run(self) -> None:
-        for index, url in enumerate(self.to_install):
-            self.progress_signal.emit(index, len(self.to_install), url)
-            self.plugin_handler.install_plugin(url)
+        # URLs of the plugins which could not be installed.
+        self.failed: List[str] = []
 
-        self.progress_signal.emit(len(self.to_install), len(self.to_install), None)
+    def run(self) -> None:
+        installer = PluginInstaller(self.plugin_handler)
+        self.failed = installer.failed
+        asyncio.run(installer.run(self.to_install, progress=self.progress_signal.emit))
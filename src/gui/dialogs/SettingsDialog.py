@@ -126,7 +126,7 @@ class SettingsDialog(QDialog):
 
         if success:
             self.prefs.switcher_directory = self.line_location.text()
-            self.prefs.commit()
+            self.prefs.flush()
 
         if error_msg:
             msg = QMessageBox()
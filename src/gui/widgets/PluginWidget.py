@@ -13,12 +13,15 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
+from typing import Optional
+
 from PyQt5 import uic
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QPixmap, QPalette, QBrush, QColor
+from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtGui import QPixmap, QPalette, QBrush, QColor, QPainter
 from PyQt5.QtWidgets import QWidget, QGraphicsDropShadowEffect
 
 from api.Plugin import Plugin
+from gui import ThumbnailCache
 from utils import resources
 
 color1 = QColor(255, 255, 0)
@@ -27,6 +30,8 @@ strength1 = 0.05
 color2 = QColor(0, 0, 0)
 strength2 = 0.1
 
+placeholder_color = QColor(48, 48, 48)
+
 
 class PluginWidget(QWidget):
     def __init__(self, plugin: Plugin, window):
@@ -53,6 +58,8 @@ class PluginWidget(QWidget):
         self.mousePressEvent = self.onclick
 
         self.exact_size = (width, height)
+        # Size of the header image being shown, if it has loaded.
+        self.header_size: Optional[QSize] = None
 
         self.active = False
         self.effect = self.get_effect()
@@ -61,13 +68,47 @@ class PluginWidget(QWidget):
         self.on_activation_changed()
 
     async def coro_initialise(self) -> None:
-        backgrnd = QPixmap(await self.plugin.get_header())
-        backgrnd = backgrnd.scaled(self.size(), transformMode=Qt.SmoothTransformation)
+        size = self.size()
+
+        # The header is already showing at this size.
+        if self.header_size == size:
+            return
+
+        # Show a placeholder until the header image has been downloaded.
+        if self.header_size is None:
+            self.set_background(self.get_placeholder())
+
+        if header := await self.plugin.get_header():
+            backgrnd = await ThumbnailCache.get_instance().get(
+                self.plugin.get_uid(), header, size
+            )
+
+            # The widget was resized again while the thumbnail loaded; the newer size will be shown instead.
+            if size != self.size():
+                return
+
+            self.set_background(backgrnd)
+            self.header_size = size
+
+        self.setGraphicsEffect(self.effect)
+
+    def set_background(self, backgrnd: QPixmap) -> None:
         palette = QPalette()
         palette.setBrush(QPalette.Background, QBrush(backgrnd))
         self.setPalette(palette)
 
-        self.setGraphicsEffect(self.effect)
+    def get_placeholder(self) -> QPixmap:
+        placeholder = QPixmap(self.size())
+        placeholder.fill(placeholder_color)
+
+        painter = QPainter(placeholder)
+        painter.setPen(Qt.white)
+        painter.drawText(
+            placeholder.rect(), Qt.AlignCenter, self.plugin.get_name() or ""
+        )
+        painter.end()
+
+        return placeholder
 
     def onclick(self, event):
         # self.indicator.setVisible(not self.indicator.isVisible())
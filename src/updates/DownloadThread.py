@@ -16,7 +16,7 @@
 
 import os
 from os.path import join
-from urllib.request import urlopen
+from typing import Optional, Tuple
 
 from PyQt5.QtCore import QThread, pyqtSignal
 from github.GitRelease import GitRelease
@@ -24,8 +24,9 @@ from github.GitRelease import GitRelease
 from api import files
 from api.Platform import Platform
 from updates import checksum
+from updates.RangeDownloader import RangeDownloader
 from updates.UpdateHandler import parse_checksum
-from utils import online
+from utils import online, settings
 
 
 class DownloadThread(QThread):
@@ -66,40 +67,54 @@ class DownloadThread(QThread):
         self.signal_download_started.emit()
 
         # Download installer.
-        location: str = self.download_release(tag, url, name, size)
+        location, digest = self.download_release(tag, url, name, size)
 
         _checksum = parse_checksum(release.body, name)
 
         self.signal_verify_started.emit()
-        verified = self.verify_installer(location, _checksum)
+        verified = self.verify_installer(location, _checksum, digest)
         self.signal_verify_finished.emit(verified)
 
         if verified:
             self.signal_installer_path.emit(location)
-
-    def verify_installer(self, location: str, expected_checksum: str) -> bool:
-        real_checksum = checksum.sha256sum(location)
+        else:
+            # Download the installer again next time, rather than reusing a bad copy.
+            os.remove(location)
+
+    def verify_installer(
+        self, location: str, expected_checksum: str, digest: Optional[str] = None
+    ) -> bool:
+        """
+        Checks the installer's SHA-256 against the checksum published with the release.
+
+        :param location: the path to the installer
+        :param expected_checksum: the published checksum
+        :param digest: the SHA-256 calculated while downloading, if available; otherwise the installer is read again
+        :return: whether the installer is valid
+        """
+        real_checksum = digest or checksum.sha256sum(location)
         return expected_checksum == real_checksum
 
-    def download_release(self, tag: str, url: str, filename: str, size: int):
+    def download_release(
+        self, tag: str, url: str, filename: str, size: int
+    ) -> Tuple[str, Optional[str]]:
         target_dir = join(self.installer_folder, tag)
         os.makedirs(target_dir, exist_ok=True)
 
-        filepath = join(target_dir, filename)
-
-        with urlopen(url) as response:
-            with open(filepath, "wb") as f:
-                bytes = 0
-                bs = 1024 * 10
-
-                while True:
-                    buffer = response.read(bs)
-                    if not buffer:
-                        break
-
-                    f.write(buffer)
-                    bytes += bs
-
-                    self.signal_download_progress.emit(bytes / size)
-
-        return filepath
+        # The installer was downloaded before but not installed, so it only needs to be verified.
+        if os.path.exists(filepath := join(target_dir, filename)):
+            self.signal_download_progress.emit(1.0)
+            return filepath, None
+
+        prefs = settings.get_instance()
+        downloader = RangeDownloader(
+            url,
+            filepath,
+            segments=prefs.download_segments,
+            buffer_size=prefs.download_buffer_size,
+            progress=lambda done, total: self.signal_download_progress.emit(
+                done / (total or size)
+            ),
+        )
+
+        return downloader.download(), downloader.sha256
@@ -0,0 +1,318 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Any
+
+import requests
+
+from utils import serialization
+
+
+class DownloadException(Exception):
+    pass
+
+
+class RangeDownloader:
+    """
+    Downloads a file using HTTP range requests.
+
+    Large files are split into segments which are downloaded in parallel. The data is written to a ".part" file, and
+    the progress of each segment is saved alongside it, so an interrupted download resumes where it stopped. If the
+    server doesn't support range requests, the file is downloaded in one piece instead.
+    """
+
+    # Files smaller than this aren't split into segments.
+    min_segment_size = 4 * 1024 * 1024
+    # Bytes downloaded between saving the progress of the segments.
+    save_interval = 4 * 1024 * 1024
+    timeout = 30
+
+    def __init__(
+        self,
+        url: str,
+        filepath: str,
+        segments: int = 4,
+        buffer_size: int = 256 * 1024,
+        progress: Callable[[int, int], None] = None,
+        progress_interval: float = 0.1,
+    ):
+        """
+        :param url: the URL to download
+        :param filepath: the path to save the file to
+        :param segments: the maximum number of segments to download in parallel
+        :param buffer_size: the number of bytes to read from the network at a time
+        :param progress: function called with the number of bytes downloaded and the size of the file
+        :param progress_interval: the minimum number of seconds between calls to `progress`
+        """
+        self.url = url
+        self.filepath = filepath
+        self.segments = max(1, segments)
+        self.buffer_size = buffer_size
+        self.progress = progress
+        self.progress_interval = progress_interval
+
+        self.part_path = f"{filepath}.part"
+        self.state_path = f"{filepath}.part.yaml"
+
+        self.size = 0
+        self.downloaded = 0
+
+        self._state: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._last_progress = 0.0
+        self._unsaved = 0
+
+        # The SHA-256 of the file is calculated as the data arrives. Segments arrive out of order, so only the data up
+        # to `_hashed` is included; data beyond it is read back from the file once the bytes before it have arrived.
+        self._sha256 = hashlib.sha256()
+        self._hashed = 0
+        self._hash_lock = threading.Lock()
+        # The hex digest of the file, once it has been downloaded.
+        self.sha256: Optional[str] = None
+
+    def download(self) -> str:
+        """
+        Downloads the file, resuming a previous attempt if possible.
+
+        :return: the path to the downloaded file
+        """
+        with requests.Session() as session:
+            url, size, validator, ranges = self._probe(session)
+            self.size = size
+
+            if ranges and size:
+                self._state = self._load_state(url, size, validator) or self._new_state(
+                    url, size, validator
+                )
+                self.downloaded = sum(s["done"] for s in self._state["segments"])
+                self._hash_available()
+
+                pending = [
+                    s
+                    for s in self._state["segments"]
+                    if s["done"] < s["end"] - s["start"]
+                ]
+                if self.downloaded:
+                    logging.info(
+                        f"Resuming download of {self.url} from {self.downloaded} bytes."
+                    )
+
+                try:
+                    with ThreadPoolExecutor(max_workers=len(pending) or 1) as executor:
+                        for future in [
+                            executor.submit(self._download_segment, session, url, s)
+                            for s in pending
+                        ]:
+                            future.result()
+                finally:
+                    self._save_state()
+            else:
+                self._download_whole(session, url)
+
+        if self.size and os.path.getsize(self.part_path) != self.size:
+            raise DownloadException(
+                f"Downloaded {os.path.getsize(self.part_path)} bytes, expected {self.size}."
+            )
+
+        if self.size and self._hashed == self.size:
+            self.sha256 = self._sha256.hexdigest()
+
+        os.replace(self.part_path, self.filepath)
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+        self._report(force=True)
+        return self.filepath
+
+    def _probe(self, session: requests.Session):
+        # Ask for the first byte, which also follows any redirects (e.g. from GitHub to its storage).
+        with session.get(
+            self.url, headers={"Range": "bytes=0-0"}, stream=True, timeout=self.timeout
+        ) as r:
+            r.raise_for_status()
+
+            if r.status_code == 206 and (
+                content_range := r.headers.get("Content-Range", "")
+            ):
+                size = int(content_range.rsplit("/", 1)[-1])
+                validator = r.headers.get("ETag") or r.headers.get("Last-Modified")
+                return r.url, size, validator, True
+
+            return r.url, int(r.headers.get("Content-Length") or 0), None, False
+
+    def _new_state(
+        self, url: str, size: int, validator: Optional[str]
+    ) -> Dict[str, Any]:
+        count = max(1, min(self.segments, math.ceil(size / self.min_segment_size)))
+        step = math.ceil(size / count)
+
+        with open(self.part_path, "wb") as f:
+            f.truncate(size)
+
+        return {
+            "url": self.url,
+            "size": size,
+            "validator": validator,
+            "segments": [
+                {"start": start, "end": min(start + step, size), "done": 0}
+                for start in range(0, size, step)
+            ],
+        }
+
+    def _load_state(
+        self, url: str, size: int, validator: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.state_path) or not os.path.exists(self.part_path):
+            return None
+
+        try:
+            state = serialization.load(self.state_path)
+        except Exception as e:
+            logging.warning(f"Could not read the progress of a previous download: {e}")
+            return None
+
+        # Start again if the file on the server has changed.
+        if (
+            state.get("url") != self.url
+            or state.get("size") != size
+            or state.get("validator") != validator
+            or os.path.getsize(self.part_path) != size
+        ):
+            return None
+
+        return state
+
+    def _save_state(self) -> None:
+        with self._lock:
+            self._unsaved = 0
+            serialization.dump(self._state, self.state_path)
+
+    def _download_segment(
+        self, session: requests.Session, url: str, segment: Dict[str, int]
+    ) -> None:
+        start = segment["start"] + segment["done"]
+        end = segment["end"]
+
+        headers = {"Range": f"bytes={start}-{end - 1}"}
+        with session.get(
+            url, headers=headers, stream=True, timeout=self.timeout
+        ) as r, open(self.part_path, "r+b", buffering=0) as f:
+            r.raise_for_status()
+            if r.status_code != 206:
+                raise DownloadException(
+                    f"The server ignored the range request for {url}."
+                )
+
+            f.seek(start)
+
+            for chunk in r.iter_content(self.buffer_size):
+                # Don't write past the end of the segment if the server sends too much.
+                chunk = chunk[: end - segment["start"] - segment["done"]]
+                if not chunk:
+                    break
+
+                f.write(chunk)
+                self._advance(segment, chunk)
+
+        if segment["done"] != end - segment["start"]:
+            raise DownloadException(f"The download of {url} ended early.")
+
+    def _download_whole(self, session: requests.Session, url: str) -> None:
+        self.downloaded = 0
+
+        with session.get(url, stream=True, timeout=self.timeout) as r, open(
+            self.part_path, "wb"
+        ) as f:
+            r.raise_for_status()
+
+            for chunk in r.iter_content(self.buffer_size):
+                f.write(chunk)
+                self._advance(None, chunk)
+
+        self.size = self.size or self.downloaded
+
+    def _advance(self, segment: Optional[Dict[str, int]], chunk: bytes) -> None:
+        count = len(chunk)
+
+        with self._lock:
+            offset = (
+                self.downloaded
+                if segment is None
+                else segment["start"] + segment["done"]
+            )
+            if segment is not None:
+                segment["done"] += count
+
+            self.downloaded += count
+            self._unsaved += count
+            save = segment is not None and self._unsaved >= self.save_interval
+
+        with self._hash_lock:
+            if offset == self._hashed:
+                self._sha256.update(chunk)
+                self._hashed += count
+
+                # This chunk may have reached data which another segment has already downloaded.
+                if segment is not None and self._hashed == segment["end"]:
+                    self._hash_available()
+
+        if save:
+            self._save_state()
+
+        self._report()
+
+    def _hash_available(self) -> None:
+        """
+        Hashes the data which has already been written to the file following the data hashed so far.
+        """
+        with self._lock:
+            segments = [
+                (s["start"], s["start"] + s["done"], s["end"])
+                for s in self._state["segments"]
+            ]
+
+        with open(self.part_path, "rb") as f:
+            for start, available, end in segments:
+                if not start <= self._hashed < end:
+                    continue
+
+                f.seek(self._hashed)
+                while self._hashed < available:
+                    data = f.read(min(self.buffer_size, available - self._hashed))
+                    if not data:
+                        return
+
+                    self._sha256.update(data)
+                    self._hashed += len(data)
+
+                # Stop at a segment which hasn't finished, since the data after it hasn't been hashed yet.
+                if available < end:
+                    return
+
+    def _report(self, force: bool = False) -> None:
+        if not self.progress:
+            return
+
+        now = time.monotonic()
+        if force or now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            self.progress(self.downloaded, self.size)
@@ -15,12 +15,11 @@
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
 import time
 
-import yaml
 from scheduler.Scheduler import Scheduler
 
 from api import files
 from updates.CleanupThread import CleanupThread
-from utils import online, settings
+from utils import online, settings, serialization
 
 
 def parse_checksum(text: str, filename: str) -> str:
@@ -54,10 +53,8 @@ class UpdateHandler:
         return releases[0]
 
     def get_current_version(self) -> str:
-        with open("manifest.yaml", "r") as f:
-            data = yaml.safe_load(f)
-
-            return data.get("version")
+        data = serialization.load("manifest.yaml")
+        return data.get("version")
 
     def cleanup(self) -> None:
         self.cleanup_thread = CleanupThread(
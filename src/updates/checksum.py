@@ -18,12 +18,22 @@
 import hashlib
 
 
-def sha256sum(filepath: str) -> str:
+def sha256sum(filepath: str, buffer_size: int = 1024 * 1024) -> str:
+    """
+    Calculates the SHA-256 of a file.
+
+    The file is read into one reusable buffer, in blocks large enough to read at the speed of the disk.
+
+    :param filepath: the path to the file
+    :param buffer_size: the number of bytes to read at a time
+    :return: the hex digest
+    """
     sha256 = hashlib.sha256()
-    bs = 4096
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
 
-    with open(filepath, "rb") as f:
-        for block in iter(lambda: f.read(bs), b""):
-            sha256.update(block)
+    with open(filepath, "rb", buffering=0) as f:
+        while n := f.readinto(buffer):
+            sha256.update(view[:n])
 
     return sha256.hexdigest()
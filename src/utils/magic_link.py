@@ -17,8 +17,10 @@ import difflib
 import json
 import logging
 import os
-from pathlib import Path
-from typing import Dict, Optional
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, List, Tuple
 
 import requests
 from requests import Response
@@ -67,6 +69,37 @@ def _get_data_dict(game: str, game_path: str) -> Dict:
     return data
 
 
+# Folders which never contain the game's executable, but often contain many other executables and files.
+ignored_folders = {
+    "_commonredist",
+    "redist",
+    "redists",
+    "redistributable",
+    "redistributables",
+    "vcredist",
+    "directx",
+    "dotnet",
+    "dotnetfx",
+    "__installer",
+    "installers",
+    "easyanticheat",
+    "battleye",
+    "shadercache",
+    "shadercaches",
+    "shader_cache",
+    "shaders",
+    "crashreporter",
+}
+
+max_depth = 6
+time_budget = 2.0  # Seconds.
+
+# Executables found in each game folder, keyed by the folder. Each value holds the modification times of the folders
+# which were searched, since adding or removing a file only changes the modification time of the folder containing it.
+_executables: Dict[str, Tuple[Dict[str, int], List[str]]] = {}
+_lock = threading.Lock()
+
+
 def _find_executable(filepath: str, game: str) -> Optional[str]:
     """
     Finds the most promising executable within a game folder.
@@ -88,35 +121,108 @@ def _find_executable(filepath: str, game: str) -> Optional[str]:
     Optional[str]
         The absolute path to the most likely game executable, or None if there are no executables in the game folder.
     """
-    executables = []
-
-    # Find all executables within the game folder.
-    for f in Path(filepath).rglob("*.exe"):
-        executables.append(f"{f.absolute()}")
+    executables = _list_executables(filepath)
 
     # If possible, remove all executables not within a "bin" or "win" folder.
-    if bin_or_win := list(
-        filter(lambda e: "bin" in e or "win" in e.lower(), executables)
-    ):
+    if bin_or_win := [e for e in executables if "bin" in e or "win" in e.lower()]:
         executables = bin_or_win
 
-    # Sort the executables by their similarity to the game name.
-    executables = sorted(
-        executables,
-        key=lambda f: difflib.SequenceMatcher(None, game, f).ratio(),
-        reverse=True,
-    )
-
     # If possible, remove uninstall executables.
-    if not_uninstall := list(
-        filter(lambda e: "unins" not in os.path.split(e)[-1].lower(), executables)
-    ):
+    if not_uninstall := [
+        e for e in executables if "unins" not in os.path.split(e)[-1].lower()
+    ]:
         executables = not_uninstall
 
-    if executables:
-        out = executables[0]
+    if out := _most_similar(game, filepath, executables):
         print(out)
 
-        return out
+    return out
+
+
+def _list_executables(folder: str) -> List[str]:
+    """
+    Lists the executables in a game folder, or gets them from the cache if the folder hasn't changed.
+
+    The folder is searched breadth-first, so the executables nearest the top are found first. Folders known not to
+    contain the game's executable are skipped, and the search stops at `max_depth` or when `time_budget` runs out.
+    A search which ran out of time isn't cached.
+    """
+    with _lock:
+        cached = _executables.get(folder)
+
+    if cached and _unchanged(cached[0]):
+        return cached[1]
+
+    executables = []
+    visited: Dict[str, int] = {}
+    deadline = time.monotonic() + time_budget
+    pending = deque([(folder, 0)])
+
+    while pending and time.monotonic() < deadline:
+        path, depth = pending.popleft()
+
+        try:
+            # Taken before listing, so a change while listing is noticed next time.
+            visited[path] = os.stat(path).st_mtime_ns
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        for e in entries:
+            name = e.name.lower()
+
+            if e.is_dir(follow_symlinks=False):
+                if depth < max_depth and name not in ignored_folders:
+                    pending.append((e.path, depth + 1))
+            elif name.endswith(".exe"):
+                executables.append(os.path.abspath(e.path))
+
+    if pending:
+        logging.warning(f"Stopped searching {folder} for executables early.")
+    else:
+        with _lock:
+            _executables[folder] = (visited, executables)
+
+    return executables
+
+
+def _unchanged(mtimes: Dict[str, int]) -> bool:
+    """
+    :return: whether none of the folders have changed since their modification times were recorded
+    """
+    try:
+        return all(os.stat(p).st_mtime_ns == m for p, m in mtimes.items())
+    except OSError:
+        return False
+
+
+def _most_similar(game: str, folder: str, executables: List[str]) -> Optional[str]:
+    """
+    Finds the executable whose path is most similar to the game name.
+
+    `SequenceMatcher.quick_ratio` is cheap and never less than `ratio`, so the full comparison is skipped for
+    executables which can't beat the best found so far.
+    """
+    best, best_ratio = None, -1.0
+    matcher = difflib.SequenceMatcher()
+    # The path to the game folder is shared by every executable, so it doesn't help to tell them apart.
+    matcher.set_seq2(game)
+
+    candidates = []
+    for e in executables:
+        matcher.set_seq1(os.path.relpath(e, folder))
+        candidates.append((matcher.quick_ratio(), e))
+
+    # Sort by the upper bound, keeping the breadth-first order for ties.
+    candidates.sort(key=lambda c: c[0], reverse=True)
+
+    for bound, e in candidates:
+        if bound <= best_ratio:
+            break
+
+        matcher.set_seq1(os.path.relpath(e, folder))
+        if (ratio := matcher.ratio()) > best_ratio:
+            best, best_ratio = e, ratio
 
-    return None
+    return best
@@ -26,11 +26,18 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
-from typing import Tuple, List
+import logging
+import threading
+import time
+from types import SimpleNamespace
+from typing import Tuple, List, Dict, Any, Optional
 
+import requests
 from github import Github
 from github.GitRelease import GitRelease
-from github.PaginatedList import PaginatedList
+
+from api import files
+from utils import serialization, settings
 
 whitelist = {"SwitcherForGames": "Switcher For Games"}
 blacklist = []
@@ -38,6 +45,182 @@ blacklist = []
 template = "Switcher plugin for "
 g = Github()
 
+query = "topic:switcher-plugin"
+ttl = 60 * 60  # Seconds before the catalog is refreshed.
+retry_delay = 60  # Seconds to wait before trying again after a failed refresh.
+timeout = 10
+
+# The fields kept from each repository in the search results.
+_fields = ("name", "full_name", "description", "url", "html_url")
+
+
+class OnlinePlugin:
+    """
+    A plugin repository found on GitHub.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self.name: str = data.get("name")
+        self.full_name: str = data.get("full_name")
+        self.description: Optional[str] = data.get("description")
+        # The API URL of the repository, which the plugin is installed from.
+        self.url: str = data.get("url")
+        self.html_url: str = data.get("html_url")
+        self.owner = SimpleNamespace(login=data.get("owner", {}).get("login"))
+
+        self.game: Optional[str] = None
+        self.author: Optional[str] = None
+
+
+class PluginCatalog:
+    """
+    Local copy of the plugins available on GitHub, so the repositories don't have to be searched every time
+    plugins are listed.
+
+    The last successful search is saved to disk and returned straight away. Once it is older than `ttl`, it is
+    refreshed in the background using conditional requests, which cost nothing if the results haven't changed.
+    If GitHub can't be reached, the saved copy continues to be used.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._refreshing: Optional[threading.Thread] = None
+        self._last_attempt = 0.0
+
+    def items(self) -> List[Dict[str, Any]]:
+        """
+        Gets the repositories in the catalog, refreshing the catalog in the background if it is out of date.
+        If there is no copy of the catalog yet, the repositories are searched before returning.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            List containing the data for each repository.
+        """
+        snapshot = self._get_snapshot()
+
+        if snapshot is None:
+            self.refresh()
+            snapshot = self._get_snapshot() or {"pages": []}
+        elif time.time() - snapshot.get("time", 0) > ttl:
+            self.refresh_in_background()
+
+        return [item for page in snapshot["pages"] for item in page["items"]]
+
+    def refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing and self._refreshing.is_alive():
+                return
+
+            self._refreshing = threading.Thread(
+                target=self.refresh, name="PluginCatalog", daemon=True
+            )
+            self._refreshing.start()
+
+    def refresh(self) -> bool:
+        """
+        Searches GitHub for plugins, reusing the pages of results which haven't changed.
+
+        Returns
+        -------
+        bool
+            Whether the catalog was refreshed.
+        """
+        if time.time() - self._last_attempt < retry_delay:
+            return False
+
+        self._last_attempt = time.time()
+        previous = {p["url"]: p for p in (self._get_snapshot() or {}).get("pages", [])}
+
+        pages = []
+        url = (
+            f"{settings.get_instance().github_api_url.rstrip('/')}/search/repositories"
+        )
+        params = {"q": query, "per_page": 100}
+
+        try:
+            with requests.Session() as session:
+                session.headers["Accept"] = "application/vnd.github.v3+json"
+
+                while url:
+                    r = session.get(
+                        url,
+                        params=params,
+                        headers=_conditional_headers(previous.get(url)),
+                        timeout=timeout,
+                    )
+
+                    if r.status_code == 304:
+                        page = previous[url]
+                    else:
+                        r.raise_for_status()
+                        page = {
+                            "url": url,
+                            "etag": r.headers.get("ETag"),
+                            "next": r.links.get("next", {}).get("url"),
+                            "items": [_trim(i) for i in r.json().get("items", [])],
+                        }
+
+                    pages.append(page)
+
+                    # The following pages' URLs include the query.
+                    url = page["next"]
+                    params = None
+        except (requests.RequestException, ValueError) as e:
+            logging.warning(f"Could not refresh the plugin catalog: {e}")
+            return False
+
+        snapshot = {"time": time.time(), "pages": pages}
+        with self._lock:
+            self._snapshot = snapshot
+
+        serialization.dump(snapshot, self.path)
+        logging.info(
+            f"Refreshed the plugin catalog ({sum(len(p['items']) for p in pages)} plugins)."
+        )
+        return True
+
+    def _get_snapshot(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self._snapshot is None:
+                try:
+                    self._snapshot = serialization.load(self.path)
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    logging.error(f"Could not read the plugin catalog: {e}")
+
+            return self._snapshot
+
+
+def _conditional_headers(page: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    if page and page.get("etag"):
+        return {"If-None-Match": page["etag"]}
+
+    return {}
+
+
+def _trim(item: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: item.get(k) for k in _fields}
+    out["owner"] = {"login": (item.get("owner") or {}).get("login")}
+
+    return out
+
+
+_catalog: PluginCatalog = None
+
+
+def get_catalog() -> PluginCatalog:
+    global _catalog
+
+    if not _catalog:
+        _catalog = PluginCatalog(files.catalog_path())
+
+    return _catalog
+
 
 def find_online_plugins() -> Tuple[List, List]:
     """
@@ -84,9 +267,8 @@ def find_online_plugins() -> Tuple[List, List]:
     return trusted, untrusted
 
 
-def search_plugins() -> PaginatedList:
-    repos = g.search_repositories(query="topic:switcher-plugin")
-    return repos
+def search_plugins() -> List[OnlinePlugin]:
+    return [OnlinePlugin(i) for i in get_catalog().items()]
 
 
 def get_switcher_releases() -> List[GitRelease]:
@@ -0,0 +1,149 @@
+#  Switcher, a tool for managing graphics and keymap profiles in games.
+#  Copyright (C) 2020 Sam McCormack
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import copy
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Tuple
+
+import yaml
+
+# Use the libyaml bindings if they are available, since they are much faster than the pure-Python implementation.
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+    logging.info("libyaml is not available; using the pure-Python YAML parser.")
+
+
+class Stats:
+    """
+    Counters describing how much work the YAML cache has saved.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.parse_time = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.hits} cache hits, {self.misses} cache misses, "
+            f"{self.parse_time:.3f}s spent parsing"
+        )
+
+
+stats = Stats()
+
+# Parsed files, keyed by path, from least to most recently used. Each value holds the (modification time, size) of
+# the file when it was parsed.
+_cache: "OrderedDict[str, Tuple[Tuple[int, int], Any]]" = OrderedDict()
+_cache_bytes = 0
+_lock = threading.Lock()
+
+# Total size of the files kept in the cache. The least recently used files are evicted beyond this.
+max_cache_bytes = 8 * 1024 * 1024
+
+
+def loads(text: str) -> Any:
+    return yaml.load(text, Loader=SafeLoader)
+
+
+def dumps(data: Any) -> str:
+    return yaml.dump(data, Dumper=SafeDumper)
+
+
+def load(path: str) -> Any:
+    """
+    Loads a YAML file. Files which haven't changed since they were last loaded are not parsed again.
+
+    :param path: the path to the file
+    :return: the parsed contents of the file, which the caller is free to modify
+    """
+    key = os.path.abspath(path)
+    stamp = _stamp(key)
+
+    with _lock:
+        if cached := _cache.get(key):
+            _cache.move_to_end(key)
+
+    if cached and cached[0] == stamp:
+        stats.hits += 1
+        return copy.deepcopy(cached[1])
+
+    start = time.perf_counter()
+    with open(key, "r") as f:
+        data = yaml.load(f, Loader=SafeLoader)
+
+    stats.misses += 1
+    stats.parse_time += time.perf_counter() - start
+
+    _put(key, stamp, data)
+
+    return copy.deepcopy(data)
+
+
+def dump(data: Any, path: str) -> None:
+    """
+    Saves data to a YAML file. The file is written to a temporary file first and then renamed, so it
+    is never left partially written.
+
+    :param data: the data to save
+    :param path: the path to the file
+    """
+    key = os.path.abspath(path)
+    temp = f"{key}.{uuid.uuid4()}.tmp"
+
+    try:
+        with open(temp, "w") as f:
+            yaml.dump(data, f, Dumper=SafeDumper)
+
+        os.replace(temp, key)
+    except Exception as e:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise e
+
+    # The data is already known, so there's no need to parse the file next time it's loaded.
+    _put(key, _stamp(key), copy.deepcopy(data))
+
+
+def _put(key: str, stamp: Tuple[int, int], data: Any) -> None:
+    global _cache_bytes
+
+    with _lock:
+        if old := _cache.pop(key, None):
+            _cache_bytes -= old[0][1]
+
+        # Files too large for the cache would only evict everything else.
+        if stamp[1] > max_cache_bytes:
+            return
+
+        _cache[key] = (stamp, data)
+        _cache_bytes += stamp[1]
+
+        while _cache_bytes > max_cache_bytes:
+            _, (evicted, _) = _cache.popitem(last=False)
+            _cache_bytes -= evicted[1]
+
+
+def _stamp(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
@@ -13,12 +13,14 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import atexit
+import copy
 import os
-from typing import Dict, List
-
-import yaml
+import threading
+from typing import Dict, List, Any, Callable, Set, Optional
 
 from api import files
+from utils import serialization
 
 _settings: "Settings" = None
 
@@ -32,44 +34,159 @@ def get_instance() -> "Settings":
     return _settings
 
 
+class Field:
+    """
+    Declares a setting, with its default value and optionally how it is converted to and from YAML.
+
+    Assigning a different value to a field marks it as changed, so it will be written by the next commit.
+    Note that modifying a mutable value in place does not mark it as changed; assign a new value instead.
+    """
+
+    def __init__(
+        self,
+        default: Any,
+        encode: Callable[[Any], Any] = None,
+        decode: Callable[[Any], Any] = None,
+    ):
+        self.default = default
+        self.encode = encode or (lambda v: v)
+        self.decode = decode or (lambda v: v)
+        self.name: str = None
+
+    def __set_name__(self, owner, name: str) -> None:
+        self.name = name
+
+    def __get__(self, instance: "Settings", owner) -> Any:
+        if instance is None:
+            return self
+
+        if self.name not in instance._values:
+            instance._values[self.name] = copy.deepcopy(self.default)
+
+        return instance._values[self.name]
+
+    def __set__(self, instance: "Settings", value: Any) -> None:
+        if self.__get__(instance, type(instance)) != value:
+            instance._values[self.name] = value
+            instance._dirty.add(self.name)
+
+
+def _compact_paths(paths: List[str]) -> Dict[str, List[str]]:
+    """
+    Groups paths by their parent folder, since most games are found in a few library folders.
+    """
+    out = {}
+    for p in paths:
+        parent, name = os.path.split(p)
+        out.setdefault(parent, []).append(name)
+
+    return out
+
+
+def _expand_paths(compact: Any) -> List[str]:
+    # Older versions stored a plain list of paths.
+    if isinstance(compact, list):
+        return compact
+
+    return [os.path.join(parent, n) for parent, names in compact.items() for n in names]
+
+
 class Settings:
-    switcher_directory: str = files._switcher_directory
-    last_update_check: float = 0
-    new_release_tag: str = None
-    version = 1
-    games: List[str] = []
+    switcher_directory = Field(files._switcher_directory)
+    last_update_check = Field(0.0)
+    new_release_tag = Field(None)
+    version = Field(1)
+    games = Field([], encode=_compact_paths, decode=_expand_paths)
+    incremental_apply = Field(True)
+    swap_folders = Field(True)
+    copy_workers = Field(0)  # Chosen automatically when 0.
+    archive_types = Field([])  # Profile types to compress, e.g. "saves".
+    archive_codec = Field("lzma")
+    archive_level = Field(6)
+    scan_roots = Field([])  # Extra folders to search for game libraries.
+    scan_workers = Field(0)  # Chosen automatically when 0.
+    scan_time_budget = Field(0.0)  # Seconds; unlimited when 0.
+    watch_games = Field(True)  # Notice games being installed while Switcher is open.
+    github_api_url = Field("https://api.github.com")
+    install_connections = Field(4)  # Plugins downloaded at once.
+    download_segments = Field(4)  # Parts of an update downloaded at once.
+    download_buffer_size = Field(256 * 1024)
+    header_url = Field(
+        "https://cdn.akamai.steamstatic.com/steam/apps/{steam_id}/header.jpg"
+    )
+    header_connections = Field(4)  # Header images downloaded at once.
+
+    # Seconds to wait for further changes before writing to disk.
+    commit_delay = 0.5
 
     def __init__(self):
         self.__config_path = files.settings_path()
+
+        self._values: Dict[str, Any] = {}
+        self._dirty: Set[str] = set()
+        # Keys from the file which aren't declared, e.g. those written by a newer version.
+        self._unknown: Dict[str, Any] = {}
+
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+
         self.reload()
+        atexit.register(self.flush)
 
     def reload(self) -> None:
         if not os.path.exists(self.__config_path):
-            self.commit()
+            self._dirty.update(self.fields())
+            self.flush()
 
-        with open(self.__config_path, "r") as stream:
-            data = yaml.safe_load(stream)
-            self.set_fields(data)
+        data = serialization.load(self.__config_path)
+        self.set_fields(data)
 
     def commit(self) -> None:
-        with open(self.__config_path, "w") as stream:
-            data = self.get_fields()
-            yaml.safe_dump(data, stream)
+        """
+        Saves the settings which have changed. Commits made in quick succession are combined into one write.
+        """
+        with self._lock:
+            if not self._dirty or self._timer:
+                return
+
+            self._timer = threading.Timer(self.commit_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """
+        Saves the settings which have changed immediately.
+        """
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+            if not self._dirty:
+                return
+
+            serialization.dump(self.get_fields(), self.__config_path)
+            self._dirty.clear()
 
     def set_fields(self, fields: Dict) -> None:
+        declared = self.fields()
+
         if fields:
             for key, value in fields.items():
-                setattr(self, key, value)
+                if key in declared:
+                    field: Field = declared[key]
+                    self._values[key] = field.decode(value)
+                else:
+                    self._unknown[key] = value
 
     def get_fields(self) -> Dict:
-        fields = [
-            attr
-            for attr in dir(self)
-            if not callable(getattr(self, attr)) and not attr.startswith("_")
-        ]
-        out = {}
+        out = dict(self._unknown)
 
-        for f in fields:
-            out[f] = getattr(self, f)
+        for name, field in self.fields().items():
+            out[name] = field.encode(getattr(self, name))
 
         return out
+
+    @classmethod
+    def fields(cls) -> Dict[str, Field]:
+        return {k: v for k, v in vars(cls).items() if isinstance(v, Field)}
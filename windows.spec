@@ -11,7 +11,7 @@ a = Analysis(['src\\main.py'],
                  ('manifest.yaml', '.'),
                  ('LICENSE', '.'),
              ],
-             hiddenimports=["qasync"],
+             hiddenimports=["qasync", "numpy"],
              hookspath=[],
              runtime_hooks=[],
              excludes=[],